@@ -3,9 +3,20 @@
 Explore the downloaded Spotify dataset.
 """
 
-import pandas as pd
+import os
+import sys
+
+import polars as pl
 import json
 
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.data.schema import TEXT_COLUMNS, TRACK_DTYPES
+
+# Polars equivalents of the dtype names used in TRACK_DTYPES
+POLARS_DTYPES = {'float32': pl.Float32, 'int8': pl.Int8, 'int16': pl.Int16, 'int32': pl.Int32}
+
 def explore_dataset():
     """Load and explore the Spotify dataset."""
     
@@ -16,15 +27,21 @@ def explore_dataset():
     # Load tracks data
     print("\n1. TRACKS DATA")
     print("-" * 80)
-    tracks_df = pd.read_csv('data/raw/tracks.csv')
+    tracks_df = pl.read_csv(
+        'data/raw/tracks.csv',
+        schema_overrides={
+            **{col: pl.String for col in TEXT_COLUMNS},
+            **{col: POLARS_DTYPES[dtype] for col, dtype in TRACK_DTYPES.items()}
+        }
+    )
     print(f"Total tracks: {len(tracks_df):,}")
-    print(f"Columns: {list(tracks_df.columns)}")
+    print(f"Columns: {tracks_df.columns}")
     print(f"\nFirst few rows:")
     print(tracks_df.head())
     print(f"\nData types:")
-    print(tracks_df.dtypes)
+    print(tracks_df.schema)
     print(f"\nMissing values:")
-    print(tracks_df.isnull().sum())
+    print(tracks_df.null_count().transpose(include_header=True, column_names=['missing']))
     
     # Check for audio features
     audio_features = ['danceability', 'energy', 'key', 'loudness', 'mode', 
@@ -36,9 +53,9 @@ def explore_dataset():
     # Load artists data
     print("\n\n2. ARTISTS DATA")
     print("-" * 80)
-    artists_df = pd.read_csv('data/raw/artists.csv')
+    artists_df = pl.read_csv('data/raw/artists.csv')
     print(f"Total artists: {len(artists_df):,}")
-    print(f"Columns: {list(artists_df.columns)}")
+    print(f"Columns: {artists_df.columns}")
     print(f"\nFirst few rows:")
     print(artists_df.head())
     
@@ -46,13 +63,13 @@ def explore_dataset():
     print("\n\n3. SAMPLE STATISTICS")
     print("-" * 80)
     if available_features:
-        print(tracks_df[available_features].describe())
+        print(tracks_df.select(available_features).describe())
     
     # Save a summary
     summary = {
         'total_tracks': len(tracks_df),
         'total_artists': len(artists_df),
-        'columns': list(tracks_df.columns),
+        'columns': tracks_df.columns,
         'audio_features': available_features,
         'date_range': {
             'min': str(tracks_df['release_date'].min()) if 'release_date' in tracks_df.columns else 'N/A',
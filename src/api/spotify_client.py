@@ -6,8 +6,17 @@ from typing import Dict, List, Optional
 
 load_dotenv()
 
+# Spotify's audio-features endpoint accepts at most 100 IDs per call
+AUDIO_FEATURES_BATCH_SIZE = 100
+
 class SpotifyClient:
-    def __init__(self):
+    def __init__(self, requests_session=True):
+        """
+        Args:
+            requests_session: Session for Spotify API calls, passed to spotipy
+                (True for a fresh requests.Session, e.g. a requests_cache
+                CachedSession to replay responses)
+        """
         client_id = os.getenv("SPOTIFY_CLIENT_ID")
         client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
         
@@ -17,7 +26,7 @@ class SpotifyClient:
         self.sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
             client_id=client_id,
             client_secret=client_secret
-        ))
+        ), requests_session=requests_session)
 
     def search_track(self, query: str, limit: int = 1) -> List[Dict]:
         """
@@ -34,6 +43,18 @@ class SpotifyClient:
         features = self.sp.audio_features([track_id])
         return features[0] if features else None
 
+    def get_tracks_features(self, track_ids: List[str]) -> List[Optional[Dict]]:
+        """
+        Get audio features for many track IDs, 100 per request.
+        
+        Returns one entry per input ID, in order (None where Spotify has no features).
+        """
+        features = []
+        for start in range(0, len(track_ids), AUDIO_FEATURES_BATCH_SIZE):
+            batch = track_ids[start:start + AUDIO_FEATURES_BATCH_SIZE]
+            features.extend(self.sp.audio_features(batch) or [None] * len(batch))
+        return features
+
     def get_track_metadata(self, track_id: str) -> Dict:
         """
         Get detailed metadata for a track.
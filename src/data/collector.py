@@ -1,12 +1,54 @@
-import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import threading
 import time
-from typing import List, Dict, Optional
-from src.api.spotify_client import SpotifyClient
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from src.api.spotify_client import SpotifyClient, AUDIO_FEATURES_BATCH_SIZE
+from src.data.feature_cache import AudioFeatureCache
+
+# Fields copied from each audio-features response
+AUDIO_FEATURE_FIELDS = [
+    'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness',
+    'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo',
+    'duration_ms', 'time_signature'
+]
+
+# Output columns, in CSV order
+TRACK_COLUMNS = [
+    'id', 'name', 'artist', 'artist_id', 'album', 'popularity', 'genre'
+] + AUDIO_FEATURE_FIELDS
+
+class RateLimiter:
+    """Thread-safe limiter spacing API calls to a maximum rate."""
+
+    def __init__(self, requests_per_minute: int = 180):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the next request slot is available."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
 
 class DataCollector:
-    def __init__(self):
+    def __init__(self, max_workers: int = 4, requests_per_minute: int = 180,
+                 feature_cache_path: Optional[str] = 'data/cache/audio_features.sqlite'):
         self.client = SpotifyClient()
-        self.tracks_data = []
+        # Collected tracks stored column-wise: {column: [values...]}
+        self.tracks_data = {column: [] for column in TRACK_COLUMNS}
+        # IDs already in tracks_data; a track is kept once, under its first genre
+        self.seen_ids = set()
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        # Audio features already fetched in earlier runs (None disables caching)
+        self.feature_cache = AudioFeatureCache(feature_cache_path) if feature_cache_path else None
 
     def collect_from_genres(self, genres: List[str], limit_per_genre: int = 50):
         """
@@ -14,87 +56,112 @@ class DataCollector:
         """
         print(f"Starting collection for genres: {genres}")
         
-        for genre in genres:
-            print(f"Fetching tracks for genre: {genre}")
-            try:
-                # Search for tracks with this genre
-                query = f"genre:{genre}"
-                # Spotify search limit is max 50
-                search_limit = min(limit_per_genre, 50)
-                
-                # We might need pagination if limit_per_genre > 50, 
-                # but for now let's stick to simple search for the MVP
-                results = self.client.sp.search(q=query, limit=search_limit, type='track')
-                tracks = results['tracks']['items']
-                
-                self._process_tracks(tracks, genre)
-                
-                # Be nice to the API
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"Error collecting genre {genre}: {e}")
+        # Spotify search limit is max 50
+        # We might need pagination if limit_per_genre > 50, 
+        # but for now let's stick to simple search for the MVP
+        search_limit = min(limit_per_genre, 50)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = pool.map(lambda genre: self._search_genre(genre, search_limit), genres)
+            
+            # Pool tracks across genres so feature lookups use full batches
+            pending = []
+            for genre, tracks in zip(genres, results):
+                print(f"Fetched {len(tracks)} tracks for genre: {genre}")
+                pending.extend((track, genre) for track in tracks)
+        
+        self._process_tracks(pending)
 
-    def _process_tracks(self, tracks: List[Dict], genre: str = None):
+    def _search_genre(self, genre: str, limit: int) -> List[Dict]:
         """
-        Process a list of tracks: fetch features and append to internal list.
+        Search tracks for a single genre, returning an empty list on failure.
         """
-        track_ids = [t['id'] for t in tracks if t and t.get('id')]
-        
-        # Fetch features in batches (Spotify allows max 100 ids per call)
-        # Since we search with limit 50, we can do it in one go usually
-        if not track_ids:
-            return
-
         try:
-            features_list = self.client.sp.audio_features(track_ids)
+            # Search for tracks with this genre
+            query = f"genre:{genre}"
+            self.rate_limiter.acquire()
+            results = self.client.sp.search(q=query, limit=limit, type='track')
+            return results['tracks']['items']
             
-            for track, features in zip(tracks, features_list):
-                if not features:
-                    continue
-                    
-                track_info = {
-                    'id': track['id'],
-                    'name': track['name'],
-                    'artist': track['artists'][0]['name'],
-                    'artist_id': track['artists'][0]['id'],
-                    'album': track['album']['name'],
-                    'popularity': track['popularity'],
-                    'genre': genre,  # Note: Tracks don't strictly have genres, artists do. This is a proxy.
-                    # Audio features
-                    'danceability': features['danceability'],
-                    'energy': features['energy'],
-                    'key': features['key'],
-                    'loudness': features['loudness'],
-                    'mode': features['mode'],
-                    'speechiness': features['speechiness'],
-                    'acousticness': features['acousticness'],
-                    'instrumentalness': features['instrumentalness'],
-                    'liveness': features['liveness'],
-                    'valence': features['valence'],
-                    'tempo': features['tempo'],
-                    'duration_ms': features['duration_ms'],
-                    'time_signature': features['time_signature']
-                }
-                self.tracks_data.append(track_info)
-                
+        except Exception as e:
+            print(f"Error collecting genre {genre}: {e}")
+            return []
+
+    def _fetch_features(self, track_ids: List[str]) -> List[Optional[Dict]]:
+        """
+        Fetch audio features for up to 100 track IDs in one call.
+        """
+        try:
+            self.rate_limiter.acquire()
+            return self.client.get_tracks_features(track_ids)
         except Exception as e:
             print(f"Error processing tracks: {e}")
+            return [None] * len(track_ids)
+
+    def _process_tracks(self, tracks: List[Tuple[Dict, Optional[str]]]):
+        """
+        Process (track, genre) pairs: fetch features and append to internal list.
+        """
+        tracks = [(t, genre) for t, genre in tracks if t and t.get('id')]
+        if not tracks:
+            return
+
+        # Reuse features cached on disk, only ask Spotify for the rest
+        track_ids = list(dict.fromkeys(t['id'] for t, _ in tracks))
+        features_by_id = self.feature_cache.get_many(track_ids) if self.feature_cache else {}
+        uncached_ids = [tid for tid in track_ids if tid not in features_by_id]
+        
+        # Fetch features in batches of 100 ids, several batches in flight
+        batches = [
+            uncached_ids[i:i + AUDIO_FEATURES_BATCH_SIZE]
+            for i in range(0, len(uncached_ids), AUDIO_FEATURES_BATCH_SIZE)
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            features_batches = pool.map(self._fetch_features, batches)
+            
+            for features_list in features_batches:
+                fetched = [features for features in features_list if features]
+                if self.feature_cache:
+                    self.feature_cache.put_many(fetched)
+                features_by_id.update((features['id'], features) for features in fetched)
+        
+        data = self.tracks_data
+        for track, genre in tracks:
+            if track['id'] in self.seen_ids:
+                continue
+            features = features_by_id.get(track['id'])
+            if not features:
+                continue
+            self.seen_ids.add(track['id'])
+                
+            data['id'].append(track['id'])
+            data['name'].append(track['name'])
+            data['artist'].append(track['artists'][0]['name'])
+            data['artist_id'].append(track['artists'][0]['id'])
+            data['album'].append(track['album']['name'])
+            data['popularity'].append(track['popularity'])
+            # Note: Tracks don't strictly have genres, artists do. This is a proxy.
+            data['genre'].append(genre)
+            # Audio features
+            for field in AUDIO_FEATURE_FIELDS:
+                data[field].append(features[field])
 
     def save_to_csv(self, filepath: str):
         """
-        Save collected data to CSV.
+        Save collected data to CSV, or to Parquet if filepath ends in .parquet.
         """
-        if not self.tracks_data:
+        if not self.tracks_data['id']:
             print("No data to save.")
             return
             
-        df = pd.DataFrame(self.tracks_data)
-        # Remove duplicates just in case
-        df = df.drop_duplicates(subset=['id'])
+        # Already unique by id (see seen_ids); columns map straight to Arrow
+        table = pa.table(self.tracks_data)
         
-        print(f"Saving {len(df)} tracks to {filepath}")
-        df.to_csv(filepath, index=False)
+        print(f"Saving {table.num_rows} tracks to {filepath}")
+        if filepath.endswith('.parquet'):
+            pq.write_table(table, filepath, compression='zstd')
+        else:
+            pa_csv.write_csv(table, filepath)
 
 if __name__ == "__main__":
     # Simple test run
@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import orjson
+from typing import Dict, Iterable, List
+
+class AudioFeatureCache:
+    """
+    Persistent track_id -> audio-features cache backed by SQLite.
+    """
+
+    def __init__(self, path: str = 'data/cache/audio_features.sqlite'):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS audio_features (id TEXT PRIMARY KEY, json TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, track_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Return cached features for the given IDs (missing IDs are omitted).
+        """
+        track_ids = list(track_ids)
+        cached = {}
+        
+        # Stay below SQLite's bound-parameter limit
+        for i in range(0, len(track_ids), 500):
+            chunk = track_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT id, json FROM audio_features WHERE id IN ({placeholders})", chunk
+            )
+            cached.update((track_id, orjson.loads(blob)) for track_id, blob in rows)
+        
+        return cached
+
+    def put_many(self, features_list: List[Dict]):
+        """
+        Store audio-features responses, keyed by their track ID.
+        """
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO audio_features (id, json) VALUES (?, ?)",
+            [(features['id'], orjson.dumps(features).decode()) for features in features_list]
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,25 @@
+"""
+Column schema for the Spotify tracks dataset.
+"""
+
+# Audio features provided by Spotify for every track
+AUDIO_FEATURES = [
+    'danceability', 'energy', 'loudness', 'speechiness',
+    'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo'
+]
+
+# Free-text columns, always read as strings: release_date mixes '1994' and
+# '1994-05-17' style values, which breaks type inference from the head rows
+TEXT_COLUMNS = ('id', 'name', 'artists', 'id_artists', 'release_date')
+
+# Compact dtypes for known numeric columns, passed to pd.read_csv so the
+# reader allocates tight buffers instead of inferring float64/int64
+TRACK_DTYPES = {
+    **{feature: 'float32' for feature in AUDIO_FEATURES},
+    'popularity': 'int16',
+    'duration_ms': 'int32',
+    'explicit': 'int8',
+    'key': 'int8',
+    'mode': 'int8',
+    'time_signature': 'int8',
+}
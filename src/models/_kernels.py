@@ -0,0 +1,164 @@
+"""
+Compiled kernels for brute-force similarity search.
+
+Numba is optional; without it the same functions fall back to NumPy.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+HAS_NUMBA = njit is not None
+
+
+def _cosine_scores_numpy(feature_matrix: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+    """NumPy reference implementation of cosine_scores."""
+    row_norms = np.linalg.norm(feature_matrix, axis=1)
+    denom = row_norms * np.linalg.norm(query_vector)
+    dots = feature_matrix @ query_vector
+    return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def cosine_scores(feature_matrix, query_vector):
+        """
+        Cosine similarity between query_vector and every row of feature_matrix.
+        
+        Rows are streamed once; dot product and row norm are accumulated in
+        the same pass and rows are split across threads.
+        """
+        n_rows, n_features = feature_matrix.shape
+        
+        query_sq = 0.0
+        for j in range(n_features):
+            query_sq += query_vector[j] * query_vector[j]
+        query_norm = np.sqrt(query_sq)
+        
+        scores = np.empty(n_rows, dtype=feature_matrix.dtype)
+        for i in prange(n_rows):
+            dot = 0.0
+            row_sq = 0.0
+            for j in range(n_features):
+                x = feature_matrix[i, j]
+                dot += x * query_vector[j]
+                row_sq += x * x
+            denom = np.sqrt(row_sq) * query_norm
+            scores[i] = dot / denom if denom > 0 else 0.0
+        
+        return scores
+else:
+    cosine_scores = _cosine_scores_numpy
+
+
+def _topk_cosine_numpy(unit_matrix: np.ndarray, query_unit: np.ndarray, k: int,
+                       exclude: np.ndarray):
+    """NumPy reference implementation of topk_cosine."""
+    scores = unit_matrix @ query_unit
+    scores[exclude] = -np.inf
+    if 0 < k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+    candidates = candidates[scores[candidates] > -np.inf][:k]
+    return candidates, scores[candidates]
+
+
+if HAS_NUMBA:
+    from numba import get_num_threads
+    
+    @njit(cache=True)
+    def _heap_sift_down(heap_scores, heap_indices, size, pos):
+        """Restore the min-heap property below pos."""
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                return
+            if child + 1 < size and heap_scores[child + 1] < heap_scores[child]:
+                child += 1
+            if heap_scores[pos] <= heap_scores[child]:
+                return
+            heap_scores[pos], heap_scores[child] = heap_scores[child], heap_scores[pos]
+            heap_indices[pos], heap_indices[child] = heap_indices[child], heap_indices[pos]
+            pos = child
+    
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _topk_cosine_chunks(unit_matrix, query_unit, k, exclude, n_chunks):
+        """
+        Per-chunk top-k of unit_matrix @ query_unit, skipping excluded rows.
+        
+        Each chunk of rows keeps a bounded min-heap of its best k scores;
+        unfilled heap slots are left at index -1.
+        """
+        n_rows, n_features = unit_matrix.shape
+        heap_scores = np.full((n_chunks, k), -np.inf, dtype=np.float32)
+        heap_indices = np.full((n_chunks, k), -1, dtype=np.int64)
+        chunk_size = (n_rows + n_chunks - 1) // n_chunks
+        
+        for c in prange(n_chunks):
+            scores = heap_scores[c]
+            indices = heap_indices[c]
+            size = 0
+            for i in range(c * chunk_size, min((c + 1) * chunk_size, n_rows)):
+                skip = False
+                for e in range(exclude.shape[0]):
+                    if exclude[e] == i:
+                        skip = True
+                        break
+                if skip:
+                    continue
+                
+                dot = 0.0
+                for j in range(n_features):
+                    dot += unit_matrix[i, j] * query_unit[j]
+                
+                if size < k:
+                    # Sift the new entry up from the end
+                    pos = size
+                    size += 1
+                    while pos > 0 and scores[(pos - 1) // 2] > dot:
+                        parent = (pos - 1) // 2
+                        scores[pos] = scores[parent]
+                        indices[pos] = indices[parent]
+                        pos = parent
+                    scores[pos] = dot
+                    indices[pos] = i
+                elif dot > scores[0]:
+                    scores[0] = dot
+                    indices[0] = i
+                    _heap_sift_down(scores, indices, size, 0)
+        
+        return heap_scores, heap_indices
+    
+    def topk_cosine(unit_matrix: np.ndarray, query_unit: np.ndarray, k: int,
+                    exclude: np.ndarray):
+        """
+        Top-k rows of a unit-norm matrix by dot product with a unit query.
+        
+        Scoring, exclusion and selection happen in one pass over the matrix;
+        only the n_threads * k per-chunk survivors are merged in NumPy.
+        
+        Args:
+            unit_matrix: Row-normalized float32 matrix of shape (n_samples, n_features)
+            query_unit: Unit-norm query vector of shape (n_features,)
+            k: Number of rows to return
+            exclude: int64 row indices that must not be returned
+            
+        Returns:
+            Tuple of (indices, scores) sorted by decreasing score
+        """
+        n_chunks = max(1, min(get_num_threads(), len(unit_matrix)))
+        heap_scores, heap_indices = _topk_cosine_chunks(
+            unit_matrix, query_unit.astype(unit_matrix.dtype), max(k, 1), exclude, n_chunks
+        )
+        heap_scores, heap_indices = heap_scores.ravel(), heap_indices.ravel()
+        filled = heap_indices >= 0
+        heap_scores, heap_indices = heap_scores[filled], heap_indices[filled]
+        order = np.lexsort((heap_indices, -heap_scores))[:k]
+        return heap_indices[order], heap_scores[order]
+else:
+    topk_cosine = _topk_cosine_numpy
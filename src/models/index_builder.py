@@ -2,19 +2,110 @@
 Index builder for efficient similarity search.
 """
 
+import itertools
 import pandas as pd
 import numpy as np
-import json
+import orjson
 import os
-from typing import List, Dict, Tuple
-from sklearn.preprocessing import StandardScaler
+import sys
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from typing import List, Dict, Optional, Tuple
+from src.models.similarity import SimilarityComputer
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+INDEX_TYPES = ('hnsw', 'ivf', 'flat')
+
+# Stored in place of an unknown release year in int16 year columns
+MISSING_YEAR = -1
+
+# Title suffixes that mark another release of the same recording, e.g.
+# "(Live at Wembley)", "[2011 Remaster]", "- Radio Edit", "- Mono Version".
+# Anything else ("- Part 2", "- II. Andante", "(feat. X)") stays in the key.
+VERSION_MARKER = (
+    r'(?:(?:\d{4}\s+)?(?:digital(?:ly)?\s+)?remaster(?:ed)?(?:\s+version)?(?:\s+\d{4})?'
+    r'|live(?:\s+(?:at|from|in|on)\b[^\)\]]*)?'
+    r'|(?:mono|stereo)(?:\s+(?:version|mix))?'
+    r'|radio\s+edit'
+    r'|(?:single|album|radio)\s+(?:version|mix)'
+    r'|demo(?:\s+version)?'
+    r'|(?:(?:original|\d{4})\s+)?version)'
+)
+
+# Variants must be this close to the representative's duration (relative)
+VARIANT_DURATION_TOLERANCE = 0.03
 
 class IndexBuilder:
     """Build and save feature index for fast similarity search."""
     
-    def __init__(self, output_dir: str = 'models'):
+    def __init__(self, output_dir: str = 'models',
+                 index_type: str = 'hnsw',
+                 hnsw_m: int = 16,
+                 hnsw_ef_construction: int = 200,
+                 hnsw_ef_search: int = 100,
+                 ivf_n_clusters: int = 256,
+                 ivf_nprobe: int = 8,
+                 to_gpu: bool = False,
+                 sort_by_pca: bool = True,
+                 dedupe_variants: bool = True,
+                 feature_weights: Optional[Dict[str, float]] = None):
+        """
+        Initialize index builder.
+        
+        Args:
+            output_dir: Directory to save/load index files
+            index_type: ANN index to build: 'hnsw', 'ivf' or 'flat' (none)
+            hnsw_m: Number of graph neighbours per node in the HNSW index
+            hnsw_ef_construction: Candidate list size used while building HNSW
+            hnsw_ef_search: Default candidate list size used at query time
+            ivf_n_clusters: Number of k-means cells in the IVF index
+            ivf_nprobe: Number of IVF cells scanned per query
+            to_gpu: Also keep an exact inner-product index on the GPU for
+                    batched queries (requires faiss with GPU support)
+            sort_by_pca: Order rows along the first principal component so
+                         similar tracks sit next to each other in memory
+            dedupe_variants: Collapse live/remaster/etc. versions of the same
+                             song by the same artist into one index entry
+                             (only when their durations nearly match)
+            feature_weights: Feature weights of the space the ANN index is
+                             built in (SimilarityComputer defaults if None)
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {INDEX_TYPES}, got {index_type!r}")
+        
         self.output_dir = output_dir
-        self.scaler = StandardScaler()
+        self.index_type = index_type
+        # Per-feature z-score parameters (same layout as StandardScaler.mean_/scale_)
+        self.scaler_mean = None
+        self.scaler_scale = None
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.ivf_n_clusters = ivf_n_clusters
+        self.ivf_nprobe = ivf_nprobe
+        self.to_gpu = to_gpu
+        self.sort_by_pca = sort_by_pca
+        self.dedupe_variants = dedupe_variants
+        self.similarity_computer = SimilarityComputer(feature_weights)
+        self.ann_index = None
+        # Column weights the ANN index was built with
+        self.ann_weights = None
+        self.gpu_index = None
+        self._gpu_resources = None
+        # Per-track filter columns aligned with feature-matrix rows
+        self.popularity = None
+        self.release_year = None
+        self.feature_medians = None
         os.makedirs(output_dir, exist_ok=True)
     
     def build_index(self, df: pd.DataFrame, 
@@ -31,39 +122,287 @@ class IndexBuilder:
         """
         print("Building feature index...")
         
+        # Keep one representative per canonical song
+        if self.dedupe_variants and {'name', 'artists', 'duration_ms'} <= set(df.columns):
+            df = self._collapse_variants(df)
+        
         # Extract features
         print(f"  - Extracting {len(feature_columns)} features...")
-        feature_matrix = df[feature_columns].values
+        feature_matrix = df[feature_columns].to_numpy(dtype=np.float32, copy=False)
         
         # Handle any remaining NaN values
-        feature_matrix = np.nan_to_num(feature_matrix, nan=0.0)
+        feature_matrix = np.nan_to_num(feature_matrix, nan=0.0).astype(np.float32, copy=False)
         
-        # Normalize features using StandardScaler
+        # Z-score normalize features (float64 statistics, float32 matrix)
         print("  - Normalizing features...")
-        feature_matrix = self.scaler.fit_transform(feature_matrix)
+        self.scaler_mean = feature_matrix.mean(axis=0, dtype=np.float64)
+        self.scaler_scale = feature_matrix.std(axis=0, dtype=np.float64)
+        self.scaler_scale[self.scaler_scale == 0] = 1
+        feature_matrix = ((feature_matrix - self.scaler_mean.astype(np.float32))
+                          / self.scaler_scale.astype(np.float32))
+        
+        # Pre-normalize rows to unit L2 norm so cosine similarity is a dot product
+        norms = np.linalg.norm(feature_matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        feature_matrix = (feature_matrix / norms).astype(np.float32, copy=False)
+        
+        # Raw-unit medians, used to fill unspecified features in synthetic queries
+        self.feature_medians = df[feature_columns].median().to_numpy(dtype=np.float64)
+        
+        # Co-locate similar tracks; all id/idx mappings below use the sorted layout
+        if self.sort_by_pca:
+            print("  - Sorting tracks along first principal component...")
+            order = self._principal_axis_order(feature_matrix)
+            feature_matrix = feature_matrix[order]
+            df = df.iloc[order].reset_index(drop=True)
+        
+        # Build approximate nearest neighbour (and GPU) indexes in the weighted
+        # space the recommender searches, so they can be saved and reused as is
+        self.ann_weights = self.similarity_computer.weight_vector(feature_columns)
+        weighted_unit = self.weighted_unit_matrix(feature_matrix, feature_columns)
+        self.ann_index = self.build_ann_index(weighted_unit)
+        
+        if self.to_gpu:
+            self.gpu_index = self._build_gpu_index(weighted_unit)
+        del weighted_unit
         
         # Create track index mapping
         print("  - Creating track index mapping...")
+        ids = df['id'].to_numpy(dtype=str)
         track_index = {
-            'id_to_idx': {track_id: idx for idx, track_id in enumerate(df['id'])},
-            'idx_to_id': {idx: track_id for idx, track_id in enumerate(df['id'])},
-            'track_metadata': {}
+            'id_to_idx': dict(zip(ids.tolist(), range(len(ids)))),
+            'idx_to_id': ids,
+            'track_metadata': self._build_metadata(df)
         }
         
-        # Store essential metadata for each track
-        for idx, row in df.iterrows():
-            track_index['track_metadata'][str(idx)] = {
-                'id': row['id'],
-                'name': row.get('name', 'Unknown'),
-                'artists': row.get('artists', 'Unknown'),
-                'popularity': int(row.get('popularity', 0)),
-                'release_year': int(row.get('release_year', 0)) if pd.notna(row.get('release_year')) else None
-            }
+        self.popularity, self.release_year = self._filter_columns(track_index['track_metadata'])
+        
+        # Collapsed variants resolve to their representative's row position
+        if 'variant_ids' in df.columns:
+            variant_lists = df['variant_ids'].tolist()
+            rows = np.repeat(np.arange(len(variant_lists)), [len(v) for v in variant_lists])
+            track_index['id_to_idx'].update(
+                zip(itertools.chain.from_iterable(variant_lists), rows.tolist())
+            )
         
         print(f"  - Index built: {feature_matrix.shape[0]} tracks, {feature_matrix.shape[1]} features")
         
         return feature_matrix, track_index
     
+    @staticmethod
+    def _canonical_song_keys(df: pd.DataFrame) -> pd.Series:
+        """Normalized (title, primary artist) key shared by versions of a song."""
+        title = (df['name'].fillna('').str.lower()
+                 # "(Live)", "[Remastered 2011]", ...
+                 .str.replace(rf'\s*[\(\[]\s*{VERSION_MARKER}\s*[\)\]]', '', regex=True)
+                 # "- Remastered 2011", "- Live at Wembley", ...
+                 .str.replace(rf'\s+-\s+{VERSION_MARKER}\s*$', '', regex=True)
+                 .str.replace(r'[^\w\s]', '', regex=True)
+                 .str.replace(r'\s+', ' ', regex=True)
+                 .str.strip())
+        
+        # artists is a stringified list, e.g. "['Queen', 'David Bowie']"
+        artists = df['artists'].fillna('')
+        primary_artist = artists.str.extract(r'^\[\s*([\'"])(.*?)\1')[1].fillna(artists)
+        
+        return title + '\x1f' + primary_artist.str.lower().str.strip()
+    
+    def _collapse_variants(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Keep the most popular track per canonical song; the others are recorded
+        in a 'variant_ids' list column on the representative. Tracks whose
+        duration differs from the representative's by more than
+        VARIANT_DURATION_TOLERANCE are kept as separate entries.
+        """
+        keys = self._canonical_song_keys(df)
+        if 'popularity' in df.columns:
+            ranked = keys.loc[df['popularity'].sort_values(ascending=False, kind='stable').index]
+        else:
+            ranked = keys
+        is_head = ~ranked.duplicated()
+        
+        duration = df.loc[ranked.index, 'duration_ms'].astype(np.float64)
+        head_duration = duration.groupby(ranked.to_numpy(), sort=False).transform('first')
+        is_near = ((duration - head_duration).abs() <= VARIANT_DURATION_TOLERANCE * head_duration)
+        is_variant = (~is_head & is_near).to_numpy()
+        
+        variant_ids = (df.loc[ranked.index[is_variant], 'id']
+                       .groupby(ranked[is_variant]).agg(list))
+        
+        # Restore input order for the representatives, renumbered 0..n-1 so
+        # row labels are positions in the collapsed frame
+        representatives = df.loc[ranked.index[~is_variant]].sort_index()
+        heads = representatives.index.isin(ranked.index[is_head.to_numpy()])
+        collapsed = representatives.assign(variant_ids=[
+            v if head and isinstance(v, list) else []
+            for v, head in zip(keys.loc[representatives.index].map(variant_ids), heads)
+        ]).reset_index(drop=True)
+        
+        print(f"  - Collapsed {len(df) - len(collapsed)} song variants "
+              f"({len(collapsed)} canonical tracks)")
+        
+        return collapsed
+    
+    @staticmethod
+    def _principal_axis_order(feature_matrix: np.ndarray) -> np.ndarray:
+        """Row order sorting tracks by their projection on the first principal axis."""
+        centered_mean = feature_matrix.mean(axis=0, dtype=np.float64)
+        covariance = np.cov(feature_matrix, rowvar=False, dtype=np.float64)
+        # eigh returns eigenvalues in ascending order; last vector is the principal axis
+        _, eigenvectors = np.linalg.eigh(np.atleast_2d(covariance))
+        projection = (feature_matrix - centered_mean) @ eigenvectors[:, -1]
+        
+        return np.argsort(projection, kind='stable')
+    
+    @staticmethod
+    def _build_metadata(df: pd.DataFrame) -> pd.DataFrame:
+        """Extract essential per-track metadata with column-level operations."""
+        columns = ['id', 'name', 'artists', 'popularity', 'release_year']
+        if 'variant_ids' in df.columns:
+            columns.append('variant_ids')
+        metadata = df.reindex(columns=columns).reset_index(drop=True)
+        
+        metadata['name'] = metadata['name'].fillna('Unknown')
+        metadata['artists'] = metadata['artists'].fillna('Unknown')
+        metadata['popularity'] = metadata['popularity'].fillna(0).astype(np.int32)
+        metadata['release_year'] = metadata['release_year'].fillna(MISSING_YEAR).astype(np.int16)
+        
+        return metadata
+    
+    def weighted_unit_matrix(self, feature_matrix: np.ndarray,
+                             feature_columns: List[str]) -> np.ndarray:
+        """Feature matrix with column weights applied and rows rescaled to unit L2 norm."""
+        weighted = np.ascontiguousarray(
+            self.similarity_computer.apply_weights(feature_matrix, feature_columns),
+            dtype=np.float32
+        )
+        return self.similarity_computer.normalize_rows(weighted)
+    
+    def build_ann_index(self, feature_matrix: np.ndarray):
+        """
+        Build the configured ANN index over a unit-norm feature matrix.
+        
+        Args:
+            feature_matrix: L2-normalized matrix of shape (n_samples, n_features)
+            
+        Returns:
+            hnswlib/faiss index, or None for 'flat' or a missing backend
+        """
+        if self.index_type == 'hnsw':
+            return self._build_hnsw(feature_matrix)
+        if self.index_type == 'ivf':
+            return self._build_ivf(feature_matrix)
+        return None
+    
+    def _build_hnsw(self, feature_matrix: np.ndarray):
+        """Build an HNSW graph over the feature matrix (cosine space)."""
+        if hnswlib is None:
+            print("  - hnswlib not installed, skipping HNSW index")
+            return None
+        
+        n_tracks, n_features = feature_matrix.shape
+        print(f"  - Building HNSW index (M={self.hnsw_m}, "
+              f"ef_construction={self.hnsw_ef_construction})...")
+        index = hnswlib.Index(space='cosine', dim=n_features)
+        index.init_index(max_elements=n_tracks,
+                         ef_construction=self.hnsw_ef_construction,
+                         M=self.hnsw_m)
+        index.add_items(feature_matrix, np.arange(n_tracks))
+        index.set_ef(self.hnsw_ef_search)
+        
+        return index
+    
+    def _build_ivf(self, feature_matrix: np.ndarray):
+        """Build an IVF (k-means inverted file) index over unit-norm rows."""
+        if faiss is None:
+            print("  - faiss not installed, skipping IVF index")
+            return None
+        
+        n_tracks, n_features = feature_matrix.shape
+        # faiss wants ~39 training points per centroid
+        n_clusters = max(1, min(self.ivf_n_clusters, n_tracks // 39))
+        print(f"  - Building IVF index (nlist={n_clusters}, nprobe={self.ivf_nprobe})...")
+        
+        # Rows are L2-normalized, so inner product equals cosine similarity
+        quantizer = faiss.IndexFlatIP(n_features)
+        index = faiss.IndexIVFFlat(quantizer, n_features, n_clusters,
+                                   faiss.METRIC_INNER_PRODUCT)
+        index.train(feature_matrix)
+        index.add(feature_matrix)
+        index.nprobe = self.ivf_nprobe
+        
+        return index
+    
+    def _build_gpu_index(self, feature_matrix: np.ndarray):
+        """Copy the weighted unit-norm matrix into an exact inner-product index on GPU 0."""
+        if faiss is None or not hasattr(faiss, 'StandardGpuResources') or faiss.get_num_gpus() == 0:
+            print("  - faiss GPU support not available, skipping GPU index")
+            return None
+        
+        print("  - Building GPU inner-product index...")
+        self._gpu_resources = faiss.StandardGpuResources()
+        index = faiss.index_cpu_to_gpu(self._gpu_resources, 0,
+                                       faiss.IndexFlatIP(feature_matrix.shape[1]))
+        index.add(np.ascontiguousarray(feature_matrix, dtype=np.float32))
+        
+        return index
+    
+    def query_batch(self, query_matrix: np.ndarray, k: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact top-k search for several queries at once on the GPU index.
+        
+        Args:
+            query_matrix: Query vectors of shape (n_queries, n_features), with
+                          ann_weights applied (the same space as query())
+            k: Number of neighbours per query
+            
+        Returns:
+            Tuple of (indices, cosine_similarities), each (n_queries, k)
+        """
+        if self.gpu_index is None:
+            raise RuntimeError("GPU index not available; requires to_gpu=True and faiss with GPU support")
+        
+        queries = np.array(query_matrix, dtype=np.float32, ndmin=2)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        similarities, labels = self.gpu_index.search(queries / norms, min(k, self.gpu_index.ntotal))
+        
+        return labels.astype(np.int64), similarities
+    
+    def query(self, query_vector: np.ndarray, k: int = 50,
+              index=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Query the ANN index for approximate nearest neighbours.
+        
+        Args:
+            query_vector: Feature vector of shape (n_features,), with ann_weights
+                          applied (the space the index was built in)
+            k: Number of neighbours to return
+            index: Index from build_ann_index to search instead of ann_index
+            
+        Returns:
+            Tuple of (indices, cosine_distances) sorted by increasing distance
+        """
+        index = self.ann_index if index is None else index
+        if index is None:
+            raise RuntimeError("ANN index not available; build or load an index first")
+        
+        if self.index_type == 'ivf':
+            query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query /= norm
+            similarities, labels = index.search(query, min(k, index.ntotal))
+            # Cells may hold fewer than k tracks; faiss pads with -1
+            found = labels[0] >= 0
+            return labels[0][found].astype(np.int64), 1.0 - similarities[0][found]
+        
+        k = min(k, index.get_current_count())
+        index.set_ef(max(self.hnsw_ef_search, k))
+        labels, distances = index.knn_query(query_vector, k=k)
+        
+        return labels[0].astype(np.int64), distances[0]
+    
     def save_index(self, feature_matrix: np.ndarray, 
                   track_index: Dict,
                   feature_columns: List[str],
@@ -84,33 +423,76 @@ class IndexBuilder:
         np.save(matrix_path, feature_matrix)
         print(f"  - Feature matrix saved to {matrix_path}")
         
-        # Save track index
-        index_path = os.path.join(self.output_dir, 'track_index.json')
-        with open(index_path, 'w') as f:
-            json.dump(track_index, f, indent=2)
-        print(f"  - Track index saved to {index_path}")
+        # Save track IDs (row order of the feature matrix)
+        ids_path = os.path.join(self.output_dir, 'ids.npy')
+        np.save(ids_path, np.asarray(track_index['idx_to_id'], dtype=str))
+        print(f"  - Track IDs saved to {ids_path}")
+        
+        # Save track metadata as columnar Parquet
+        metadata_path = os.path.join(self.output_dir, 'metadata.parquet')
+        pq.write_table(
+            pa.Table.from_pandas(track_index['track_metadata'], preserve_index=False),
+            metadata_path,
+            compression='zstd'
+        )
+        print(f"  - Track metadata saved to {metadata_path}")
+        
+        # Save compact filter columns for pre-filtering candidates
+        self.popularity, self.release_year = self._filter_columns(track_index['track_metadata'])
+        np.save(os.path.join(self.output_dir, 'popularity.npy'), self.popularity)
+        np.save(os.path.join(self.output_dir, 'release_year.npy'), self.release_year)
+        print(f"  - Filter columns saved to {self.output_dir}")
+        
+        # Save ANN index
+        if self.ann_index is not None and self.index_type == 'hnsw':
+            hnsw_path = os.path.join(self.output_dir, 'hnsw.bin')
+            self.ann_index.save_index(hnsw_path)
+            print(f"  - HNSW index saved to {hnsw_path}")
+        elif self.ann_index is not None and self.index_type == 'ivf':
+            ivf_path = os.path.join(self.output_dir, 'ivf.index')
+            faiss.write_index(self.ann_index, ivf_path)
+            print(f"  - IVF index saved to {ivf_path}")
         
         # Save configuration
         config_data = {
             'feature_columns': feature_columns,
             'n_tracks': feature_matrix.shape[0],
             'n_features': feature_matrix.shape[1],
-            'scaler_mean': self.scaler.mean_.tolist(),
-            'scaler_scale': self.scaler.scale_.tolist()
+            'scaler_mean': self.scaler_mean.tolist(),
+            'scaler_scale': self.scaler_scale.tolist(),
+            'l2_normalized': True,
+            'row_order': 'pca' if self.sort_by_pca else 'input',
+            'index_type': self.index_type if self.ann_index is not None else 'flat',
+            'hnsw_m': self.hnsw_m,
+            'hnsw_ef_construction': self.hnsw_ef_construction,
+            'ivf_n_clusters': self.ivf_n_clusters,
+            'ivf_nprobe': self.ivf_nprobe
         }
         
+        if self.ann_index is not None:
+            config_data['ann_weights'] = self.ann_weights.tolist()
+        
+        if self.feature_medians is not None:
+            config_data['feature_medians'] = self.feature_medians.tolist()
+        
         if config:
             config_data.update(config)
         
         config_path = os.path.join(self.output_dir, 'model_config.json')
-        with open(config_path, 'w') as f:
-            json.dump(config_data, f, indent=2)
+        with open(config_path, 'wb') as f:
+            f.write(orjson.dumps(config_data,
+                                 option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
         print(f"  - Configuration saved to {config_path}")
     
-    def load_index(self) -> Tuple[np.ndarray, Dict, Dict]:
+    def load_index(self, mmap: bool = True) -> Tuple[np.ndarray, Dict, Dict]:
         """
         Load feature index from disk.
         
+        Args:
+            mmap: Memory-map the feature matrix read-only instead of reading it
+                  into RAM; pages are loaded on first touch and shared between
+                  processes serving the same index
+        
         Returns:
             Tuple of (feature_matrix, track_index, config)
         """
@@ -118,27 +500,132 @@ class IndexBuilder:
         
         # Load feature matrix
         matrix_path = os.path.join(self.output_dir, 'feature_matrix.npy')
-        feature_matrix = np.load(matrix_path)
+        feature_matrix = np.load(matrix_path, mmap_mode='r' if mmap else None)
         print(f"  - Loaded feature matrix: {feature_matrix.shape}")
         
         # Load track index
-        index_path = os.path.join(self.output_dir, 'track_index.json')
-        with open(index_path, 'r') as f:
-            track_index = json.load(f)
-        print(f"  - Loaded track index: {len(track_index['id_to_idx'])} tracks")
+        track_index = self._load_track_index()
+        print(f"  - Loaded track index: {len(track_index['idx_to_id'])} tracks")
+        
+        # Load filter columns (derived from metadata for indexes built before they were saved)
+        popularity_path = os.path.join(self.output_dir, 'popularity.npy')
+        year_path = os.path.join(self.output_dir, 'release_year.npy')
+        if os.path.exists(popularity_path) and os.path.exists(year_path):
+            self.popularity = np.load(popularity_path)
+            self.release_year = np.load(year_path)
+        else:
+            self.popularity, self.release_year = self._filter_columns(track_index['track_metadata'])
         
         # Load configuration
         config_path = os.path.join(self.output_dir, 'model_config.json')
-        with open(config_path, 'r') as f:
-            config = json.load(f)
+        with open(config_path, 'rb') as f:
+            config = orjson.loads(f.read())
         print(f"  - Loaded configuration")
         
         # Restore scaler
-        self.scaler.mean_ = np.array(config['scaler_mean'])
-        self.scaler.scale_ = np.array(config['scaler_scale'])
+        self.scaler_mean = np.array(config['scaler_mean'])
+        self.scaler_scale = np.array(config['scaler_scale'])
+        
+        # Load ANN index if one was built (indexes without ann_weights
+        # were built over the unweighted matrix)
+        self.ann_index = None
+        self.ann_weights = (np.asarray(config['ann_weights'], dtype=np.float32)
+                            if 'ann_weights' in config else None)
+        self.index_type = config.get('index_type', 'hnsw')
+        hnsw_path = os.path.join(self.output_dir, 'hnsw.bin')
+        ivf_path = os.path.join(self.output_dir, 'ivf.index')
+        if self.index_type == 'hnsw' and hnswlib is not None and os.path.exists(hnsw_path):
+            self.ann_index = hnswlib.Index(space='cosine', dim=feature_matrix.shape[1])
+            self.ann_index.load_index(hnsw_path, max_elements=feature_matrix.shape[0])
+            self.ann_index.set_ef(self.hnsw_ef_search)
+            print(f"  - Loaded HNSW index")
+        elif self.index_type == 'ivf' and faiss is not None and os.path.exists(ivf_path):
+            self.ann_index = faiss.read_index(ivf_path)
+            self.ann_index.nprobe = config.get('ivf_nprobe', self.ivf_nprobe)
+            print(f"  - Loaded IVF index")
+        
+        # GPU index is rebuilt from the weighted feature matrix rather than saved
+        self.gpu_index = None
+        if self.to_gpu:
+            self.gpu_index = self._build_gpu_index(
+                self.weighted_unit_matrix(feature_matrix, config['feature_columns'])
+            )
         
         return feature_matrix, track_index, config
     
+    def get_filter_mask(self, min_popularity: Optional[int] = None,
+                        year_range: Optional[Tuple[int, int]] = None,
+                        rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Boolean mask over tracks satisfying popularity/year predicates.
+        
+        Args:
+            min_popularity: Minimum popularity score (0-100)
+            year_range: Tuple of (min_year, max_year); unknown years never match
+            rows: Only evaluate these row indices (e.g. ranked candidates)
+            
+        Returns:
+            Boolean array of shape (n_tracks,), or (len(rows),) when rows is given
+        """
+        if self.popularity is None or self.release_year is None:
+            raise RuntimeError("Filter columns not available; build or load an index first")
+        
+        popularity, release_year = self.popularity, self.release_year
+        if rows is not None:
+            popularity, release_year = popularity[rows], release_year[rows]
+        
+        mask = np.ones(len(popularity), dtype=bool)
+        if min_popularity:
+            mask &= popularity >= min_popularity
+        if year_range:
+            mask &= release_year != MISSING_YEAR
+            mask &= (release_year >= year_range[0]) & (release_year <= year_range[1])
+        
+        return mask
+    
+    @staticmethod
+    def _filter_columns(metadata) -> Tuple[np.ndarray, np.ndarray]:
+        """Popularity (uint8) and release year (int16, MISSING_YEAR if unknown) per index row."""
+        if isinstance(metadata, dict):
+            # Legacy JSON metadata: row-number keys written in row order
+            metadata = pd.DataFrame(list(metadata.values()), columns=['popularity', 'release_year'])
+        elif isinstance(metadata, pa.Table):
+            metadata = metadata.select(['popularity', 'release_year']).to_pandas()
+        
+        popularity = metadata['popularity'].fillna(0).clip(0, 100).to_numpy(dtype=np.uint8)
+        release_year = metadata['release_year'].fillna(MISSING_YEAR).to_numpy(dtype=np.int16)
+        return popularity, release_year
+    
+    def _load_track_index(self) -> Dict:
+        """Load track ID mapping and metadata, falling back to legacy JSON."""
+        ids_path = os.path.join(self.output_dir, 'ids.npy')
+        
+        if not os.path.exists(ids_path):
+            # Index built before the Parquet layout was introduced
+            index_path = os.path.join(self.output_dir, 'track_index.json')
+            with open(index_path, 'rb') as f:
+                track_index = orjson.loads(f.read())
+            # JSON object keys were stringified row numbers, written in row order
+            track_index['idx_to_id'] = np.array(list(track_index['idx_to_id'].values()), dtype=str)
+            return track_index
+        
+        ids = np.load(ids_path)
+        metadata_path = os.path.join(self.output_dir, 'metadata.parquet')
+        metadata = pq.read_table(metadata_path, memory_map=True)
+        id_to_idx = dict(zip(ids.tolist(), range(len(ids))))
+        
+        # Collapsed variants resolve to their representative's row
+        if 'variant_ids' in metadata.column_names:
+            variants = metadata.column('variant_ids')
+            id_to_idx.update(zip(pc.list_flatten(variants).to_pylist(),
+                                 pc.list_parent_indices(variants).to_pylist()))
+        
+        return {
+            'id_to_idx': id_to_idx,
+            'idx_to_id': ids,
+            'track_metadata': metadata
+        }
+    
     @staticmethod
     def get_recommended_features() -> List[str]:
         """Get recommended feature columns for similarity computation."""
@@ -164,18 +651,24 @@ if __name__ == "__main__":
     # Test index building
     print("Testing IndexBuilder...")
     
-    # Load processed data
-    df = pd.read_csv('data/processed/tracks_processed.csv')
+    data_path = 'data/processed/tracks_processed.parquet'
     
     # Get recommended features
     feature_columns = IndexBuilder.get_recommended_features()
     
     # Filter to only existing columns
-    feature_columns = [f for f in feature_columns if f in df.columns]
+    available = set(pq.read_schema(data_path).names)
+    feature_columns = [f for f in feature_columns if f in available]
+    
+    # Load processed data (only the columns the index needs)
+    metadata_columns = ['id', 'name', 'artists', 'popularity', 'release_year']
+    usecols = [c for c in metadata_columns if c in available] + feature_columns
+    df = pd.read_parquet(data_path, columns=usecols)
     print(f"Using {len(feature_columns)} features: {feature_columns}")
     
-    # Build index
-    builder = IndexBuilder()
+    # Build index (optionally pass the index type: hnsw, ivf or flat)
+    index_type = sys.argv[1] if len(sys.argv) > 1 else 'hnsw'
+    builder = IndexBuilder(index_type=index_type)
     feature_matrix, track_index = builder.build_index(df, feature_columns)
     
     # Save index
@@ -2,23 +2,41 @@
 Music recommendation engine.
 """
 
+import functools
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from typing import List, Dict, Optional, Tuple
+from src.data.schema import TRACK_DTYPES
 from src.models.similarity import SimilarityComputer
-from src.models.index_builder import IndexBuilder
+from src.models.index_builder import IndexBuilder, MISSING_YEAR
+
+# Processed-dataset columns the recommender reads; the rest stay on disk
+METADATA_COLUMNS = [
+    'id', 'name', 'artists', 'popularity', 'release_year',
+    'danceability', 'energy', 'valence', 'tempo'
+]
+
+# Queries scored per matrix-matrix product in get_recommendations_batch; bounds
+# the score block to BATCH_BLOCK_ROWS x n_tracks float32
+BATCH_BLOCK_ROWS = 256
 
 class MusicRecommender:
     """Content-based music recommendation system."""
     
     def __init__(self, model_dir: str = 'models', 
-                 data_path: str = 'data/processed/tracks_processed.csv'):
+                 data_path: str = 'data/processed/tracks_processed.parquet',
+                 use_ann: bool = True,
+                 cache_size: int = 4096):
         """
         Initialize recommender.
         
         Args:
             model_dir: Directory containing saved model files
-            data_path: Path to processed tracks CSV
+            data_path: Path to processed tracks Parquet (or legacy CSV)
+            use_ann: Answer queries from an ANN index over the weighted features
+                     (falls back to exact search if no ANN backend is installed)
+            cache_size: Number of get_recommendations results kept in an LRU cache
         """
         self.model_dir = model_dir
         self.data_path = data_path
@@ -27,19 +45,93 @@ class MusicRecommender:
         self.index_builder = IndexBuilder(model_dir)
         self.feature_matrix, self.track_index, self.config = self.index_builder.load_index()
         
-        # Load full dataset for metadata
-        self.df = pd.read_csv(data_path)
+        # Load full dataset for metadata, aligned with feature-matrix rows
+        if data_path.endswith('.parquet'):
+            available = set(pq.read_schema(data_path).names)
+            self.df = pd.read_parquet(
+                data_path, columns=[c for c in METADATA_COLUMNS if c in available]
+            )
+        else:
+            available = set(pd.read_csv(data_path, nrows=0).columns)
+            self.df = pd.read_csv(
+                data_path,
+                usecols=[c for c in METADATA_COLUMNS if c in available],
+                dtype={**TRACK_DTYPES, 'release_year': 'int16'},
+                engine='pyarrow'
+            )
+        index_ids = self.track_index['idx_to_id']
+        if not np.array_equal(self.df['id'].to_numpy(dtype=str), index_ids):
+            self.df = self.df.set_index('id').loc[index_ids].reset_index()
+        
+        # Integer codes make the diversity filter and repeated scans cheap
+        self.df['artists'] = self.df['artists'].astype('category')
+        self.df['name'] = self.df['name'].astype('category')
+        
+        # Per-column arrays aligned with feature-matrix rows, for result building
+        self._ids = self._column_array('id', None)
+        self._names = self._column_array('name', 'Unknown')
+        self._artists = self._column_array('artists', 'Unknown')
+        self._artist_codes = self.df['artists'].cat.codes.to_numpy()
+        # Popularity and release year come from the index's filter columns
+        self._popularity = self.index_builder.popularity
+        self._release_year = self.index_builder.release_year
+        # Lowercased search columns; missing values never match
+        self._names_lc = np.char.lower(self.df['name'].to_numpy(dtype=object, na_value='').astype(str))
+        self._artists_lc = np.char.lower(self.df['artists'].to_numpy(dtype=object, na_value='').astype(str))
+        self._audio = {
+            feature: self._column_array(feature, 0, np.float64)
+            for feature in ('danceability', 'energy', 'valence', 'tempo')
+        }
         
         # Initialize similarity computer
         self.similarity_computer = SimilarityComputer()
         
-        # Apply weights to feature matrix
         feature_names = self.config['feature_columns']
-        self.weighted_feature_matrix = self.similarity_computer.apply_weights(
-            self.feature_matrix, feature_names
+        
+        # Column positions and fill values for synthetic (by-features) queries
+        self._feature_idx = {name: i for i, name in enumerate(feature_names)}
+        if self.config.get('feature_medians') is not None:
+            self._feature_medians = np.asarray(self.config['feature_medians'], dtype=np.float64)
+        else:
+            # Index predates stored medians
+            self._feature_medians = np.median(self.feature_matrix, axis=0).astype(np.float64)
+        
+        # Weighted, unit-norm rows: each query is then a single matrix-vector
+        # product. This is the only private N x D copy; the loaded matrix stays
+        # memory-mapped. Norms are kept so scores can be rescaled without another pass.
+        weighted = np.ascontiguousarray(
+            self.similarity_computer.apply_weights(self.feature_matrix, feature_names),
+            dtype=np.float32
         )
+        self._row_norms = self.similarity_computer.row_norms(weighted)
+        self._M_unit = self.similarity_computer.normalize_rows(weighted, self._row_norms)
+        del weighted
         
-        print(f"Recommender initialized with {len(self.track_index['id_to_idx'])} tracks")
+        # Reuse the saved ANN index when it was built with these weights;
+        # otherwise build one over the weighted matrix
+        self.ann_index = None
+        if use_ann and self.index_builder.index_type != 'flat':
+            saved_weights = self.index_builder.ann_weights
+            if (self.index_builder.ann_index is not None and saved_weights is not None
+                    and np.array_equal(saved_weights,
+                                       self.similarity_computer.weight_vector(feature_names))):
+                self.ann_index = self.index_builder.ann_index
+            else:
+                print("  - Saved ANN index does not match the feature weights, rebuilding...")
+                self.ann_index = self.index_builder.build_ann_index(self._M_unit)
+        
+        # Per-instance cache so entries don't outlive (or pin) this recommender
+        self._cached_recommendations = functools.lru_cache(maxsize=cache_size)(
+            self._get_recommendations_core
+        )
+        
+        print(f"Recommender initialized with {len(self.track_index['idx_to_id'])} tracks")
+    
+    def _column_array(self, column: str, default, dtype=object) -> np.ndarray:
+        """Column of self.df as an array, or filled with default if absent."""
+        if column not in self.df.columns:
+            return np.full(len(self.df), default, dtype=dtype)
+        return self.df[column].to_numpy(dtype=dtype, na_value=np.nan)
     
     def find_track_by_name(self, track_name: str, artist_name: Optional[str] = None) -> List[Dict]:
         """
@@ -52,21 +144,42 @@ class MusicRecommender:
         Returns:
             List of matching tracks with metadata
         """
-        # Case-insensitive search
-        mask = self.df['name'].str.contains(track_name, case=False, na=False)
+        # Case-insensitive substring search
+        mask = np.char.find(self._names_lc, track_name.lower()) >= 0
         
         if artist_name:
-            mask &= self.df['artists'].str.contains(artist_name, case=False, na=False)
+            mask &= np.char.find(self._artists_lc, artist_name.lower()) >= 0
         
-        matches = self.df[mask][['id', 'name', 'artists', 'popularity', 'release_year']].head(10)
+        rows = np.flatnonzero(mask)[:10]
+        matches = self.df.iloc[rows][['id', 'name', 'artists', 'popularity', 'release_year']]
         
         return matches.to_dict('records')
     
+    def _top_k(self, query_vector: np.ndarray, k: int,
+               exclude_idx: Optional[int] = None,
+               exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (indices, cosine similarities) from the ANN index or an exact scan."""
+        if self.ann_index is None or exact:
+            return self.similarity_computer.get_top_k_similar(
+                query_vector,
+                self._M_unit,
+                k=k,
+                exclude_indices=None if exclude_idx is None else [exclude_idx],
+                matrix_is_unit=True
+            )
+        
+        n_query = k if exclude_idx is None else k + 1
+        indices, distances = self.index_builder.query(query_vector, k=n_query, index=self.ann_index)
+        keep = indices != exclude_idx
+        
+        return indices[keep][:k], 1.0 - distances[keep][:k]
+    
     def get_recommendations(self, track_id: str, 
                           n_recommendations: int = 50,
                           diversity_filter: bool = True,
                           min_popularity: Optional[int] = None,
-                          year_range: Optional[Tuple[int, int]] = None) -> List[Dict]:
+                          year_range: Optional[Tuple[int, int]] = None,
+                          exact: bool = False) -> List[Dict]:
         """
         Get recommendations for a given track.
         
@@ -76,62 +189,90 @@ class MusicRecommender:
             diversity_filter: Whether to filter out multiple tracks from same artist
             min_popularity: Minimum popularity score (0-100)
             year_range: Tuple of (min_year, max_year) to filter by
+            exact: Scan all tracks instead of querying the ANN index
             
         Returns:
             List of recommended tracks with metadata and similarity scores
         """
+        if year_range is not None:
+            year_range = tuple(year_range)
+        
+        recommendations = self._cached_recommendations(
+            track_id, n_recommendations, diversity_filter, min_popularity, year_range, exact
+        )
+        
+        # Hand out copies so callers can't modify cached results
+        return [dict(rec) for rec in recommendations]
+    
+    def _get_recommendations_core(self, track_id: str,
+                                  n_recommendations: int,
+                                  diversity_filter: bool,
+                                  min_popularity: Optional[int],
+                                  year_range: Optional[Tuple[int, int]],
+                                  exact: bool) -> Tuple[Dict, ...]:
+        """Uncached get_recommendations; returns a tuple for the LRU cache."""
         # Get track index
         if track_id not in self.track_index['id_to_idx']:
             raise ValueError(f"Track ID {track_id} not found in index")
         
         track_idx = self.track_index['id_to_idx'][track_id]
         
-        # Get query vector
-        query_vector = self.weighted_feature_matrix[track_idx]
+        # Get query vector (cosine is scale-invariant, so the unit row will do)
+        query_vector = self._M_unit[track_idx]
         
         # Compute similarities (request more than needed for filtering)
         k = n_recommendations * 5 if diversity_filter else n_recommendations
-        top_k_indices, top_k_scores = self.similarity_computer.get_top_k_similar(
-            query_vector, 
-            self.weighted_feature_matrix,
+        top_k_indices, top_k_scores = self._top_k(
+            query_vector,
             k=min(k, len(self.feature_matrix)),
-            exclude_indices=[track_idx]
+            exclude_idx=track_idx,
+            exact=exact
         )
         
+        return tuple(self._filter_candidates(
+            top_k_indices, top_k_scores, n_recommendations,
+            diversity_filter, min_popularity, year_range
+        ))
+    
+    def _filter_candidates(self, top_k_indices: np.ndarray,
+                           top_k_scores: np.ndarray,
+                           n_recommendations: int,
+                           diversity_filter: bool,
+                           min_popularity: Optional[int],
+                           year_range: Optional[Tuple[int, int]]) -> List[Dict]:
+        """Apply popularity/year/diversity filters to ranked candidates and build result dicts."""
+        # Apply popularity/year filters to all candidates at once, using the
+        # filter columns saved with the index (aligned with its rows)
+        keep = self.index_builder.get_filter_mask(min_popularity, year_range, rows=top_k_indices)
+        top_k_indices = top_k_indices[keep]
+        top_k_scores = top_k_scores[keep]
+        
         # Build recommendations list
         recommendations = []
-        seen_artists = set()
+        seen_codes = np.zeros(len(self.df['artists'].cat.categories), dtype=bool)
         
         for idx, score in zip(top_k_indices, top_k_scores):
-            track_data = self.df.iloc[idx]
-            
-            # Apply filters
-            if min_popularity and track_data.get('popularity', 0) < min_popularity:
-                continue
-            
-            if year_range:
-                year = track_data.get('release_year')
-                if pd.isna(year) or year < year_range[0] or year > year_range[1]:
-                    continue
-            
             # Diversity filter: limit tracks per artist
-            artist = track_data.get('artists', 'Unknown')
             if diversity_filter:
-                if artist in seen_artists:
-                    continue
-                seen_artists.add(artist)
+                # Code -1 is a missing artist; never treat those as duplicates
+                artist_code = self._artist_codes[idx]
+                if artist_code >= 0:
+                    if seen_codes[artist_code]:
+                        continue
+                    seen_codes[artist_code] = True
             
             recommendations.append({
-                'id': track_data['id'],
-                'name': track_data.get('name', 'Unknown'),
-                'artists': artist,
-                'popularity': int(track_data.get('popularity', 0)),
-                'release_year': int(track_data.get('release_year', 0)) if pd.notna(track_data.get('release_year')) else None,
+                'id': self._ids[idx],
+                'name': self._names[idx],
+                'artists': self._artists[idx],
+                'popularity': int(self._popularity[idx]),
+                'release_year': (int(self._release_year[idx])
+                                 if self._release_year[idx] != MISSING_YEAR else None),
                 'similarity_score': float(score),
-                'danceability': float(track_data.get('danceability', 0)),
-                'energy': float(track_data.get('energy', 0)),
-                'valence': float(track_data.get('valence', 0)),
-                'tempo': float(track_data.get('tempo', 0))
+                'danceability': float(self._audio['danceability'][idx]),
+                'energy': float(self._audio['energy'][idx]),
+                'valence': float(self._audio['valence'][idx]),
+                'tempo': float(self._audio['tempo'][idx])
             })
             
             if len(recommendations) >= n_recommendations:
@@ -139,12 +280,74 @@ class MusicRecommender:
         
         return recommendations
     
+    def get_recommendations_batch(self, track_ids: List[str],
+                                  n_recommendations: int = 50,
+                                  diversity_filter: bool = True,
+                                  min_popularity: Optional[int] = None,
+                                  year_range: Optional[Tuple[int, int]] = None) -> List[List[Dict]]:
+        """
+        Get recommendations for several tracks with blocked matrix-matrix products.
+        
+        Queries are scored BATCH_BLOCK_ROWS at a time, so memory stays bounded
+        for long ID lists. Scores are exact (no ANN index). Results match
+        calling get_recommendations with exact=True for each track.
+        
+        Args:
+            track_ids: Spotify track IDs
+            n_recommendations: Number of recommendations per track
+            diversity_filter: Whether to filter out multiple tracks from same artist
+            min_popularity: Minimum popularity score (0-100)
+            year_range: Tuple of (min_year, max_year) to filter by
+            
+        Returns:
+            One recommendation list per track ID, in input order
+        """
+        missing = [t for t in track_ids if t not in self.track_index['id_to_idx']]
+        if missing:
+            raise ValueError(f"Track ID {missing[0]} not found in index")
+        
+        query_rows = np.array([self.track_index['id_to_idx'][t] for t in track_ids], dtype=np.int64)
+        if len(query_rows) == 0:
+            return []
+        
+        k = n_recommendations * 5 if diversity_filter else n_recommendations
+        k = min(k, len(self._M_unit) - 1)
+        if k <= 0:
+            return [[] for _ in track_ids]
+        
+        results = []
+        for start in range(0, len(query_rows), BATCH_BLOCK_ROWS):
+            block_rows = query_rows[start:start + BATCH_BLOCK_ROWS]
+            
+            # Query rows are already unit-norm, so this is the cosine matrix (sgemm)
+            scores = self._M_unit[block_rows] @ self._M_unit.T
+            scores[np.arange(len(block_rows)), block_rows] = -np.inf
+            
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+            order = np.argsort(-candidate_scores, axis=1, kind='stable')
+            candidates = np.take_along_axis(candidates, order, axis=1)
+            candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+            
+            results.extend(
+                self._filter_candidates(row_indices, row_scores, n_recommendations,
+                                        diversity_filter, min_popularity, year_range)
+                for row_indices, row_scores in zip(candidates, candidate_scores)
+            )
+        
+        return results
+    
+    def clear_cache(self):
+        """Drop cached get_recommendations results (e.g. after rebuilding the index)."""
+        self._cached_recommendations.cache_clear()
+    
     def get_recommendations_by_features(self, 
                                        danceability: float,
                                        energy: float,
                                        valence: float,
                                        tempo: float,
-                                       n_recommendations: int = 50) -> List[Dict]:
+                                       n_recommendations: int = 50,
+                                       exact: bool = False) -> List[Dict]:
         """
         Get recommendations based on desired audio features.
         
@@ -154,6 +357,7 @@ class MusicRecommender:
             valence: Desired valence (0-1)
             tempo: Desired tempo (BPM)
             n_recommendations: Number of recommendations
+            exact: Scan all tracks instead of querying the ANN index
             
         Returns:
             List of recommended tracks
@@ -162,26 +366,21 @@ class MusicRecommender:
         # This is simplified - in practice you'd need to match the full feature space
         feature_names = self.config['feature_columns']
         
-        # Create query vector with average values for unspecified features
-        query_vector = np.zeros(len(feature_names))
-        
-        for i, feature in enumerate(feature_names):
-            if feature == 'danceability':
-                query_vector[i] = danceability
-            elif feature == 'energy':
-                query_vector[i] = energy
-            elif feature == 'valence':
-                query_vector[i] = valence
-            elif feature == 'tempo':
-                query_vector[i] = tempo
-            elif feature == 'tempo_normalized':
-                query_vector[i] = tempo / 250.0  # Normalize
-            else:
-                # Use median value from dataset
-                query_vector[i] = np.median(self.feature_matrix[:, i])
+        # Start from median values and override the requested features
+        query_vector = self._feature_medians.copy()
+        requested = (
+            ('danceability', danceability),
+            ('energy', energy),
+            ('valence', valence),
+            ('tempo', tempo),
+            ('tempo_normalized', tempo / 250.0),  # Normalize
+        )
+        for feature, value in requested:
+            if feature in self._feature_idx:
+                query_vector[self._feature_idx[feature]] = value
         
         # Normalize using the scaler
-        query_vector = (query_vector - self.index_builder.scaler.mean_) / self.index_builder.scaler.scale_
+        query_vector = (query_vector - self.index_builder.scaler_mean) / self.index_builder.scaler_scale
         
         # Apply weights
         query_vector = self.similarity_computer.apply_weights(
@@ -189,25 +388,24 @@ class MusicRecommender:
         )[0]
         
         # Get similar tracks
-        top_k_indices, top_k_scores = self.similarity_computer.get_top_k_similar(
+        top_k_indices, top_k_scores = self._top_k(
             query_vector,
-            self.weighted_feature_matrix,
-            k=n_recommendations
+            k=n_recommendations,
+            exact=exact
         )
         
         # Build recommendations
         recommendations = []
         for idx, score in zip(top_k_indices, top_k_scores):
-            track_data = self.df.iloc[idx]
             recommendations.append({
-                'id': track_data['id'],
-                'name': track_data.get('name', 'Unknown'),
-                'artists': track_data.get('artists', 'Unknown'),
+                'id': self._ids[idx],
+                'name': self._names[idx],
+                'artists': self._artists[idx],
                 'similarity_score': float(score),
-                'danceability': float(track_data.get('danceability', 0)),
-                'energy': float(track_data.get('energy', 0)),
-                'valence': float(track_data.get('valence', 0)),
-                'tempo': float(track_data.get('tempo', 0))
+                'danceability': float(self._audio['danceability'][idx]),
+                'energy': float(self._audio['energy'][idx]),
+                'valence': float(self._audio['valence'][idx]),
+                'tempo': float(self._audio['tempo'][idx])
             })
         
         return recommendations
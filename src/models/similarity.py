@@ -5,6 +5,12 @@ Similarity computation for music recommendation.
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 from typing import Dict, List, Optional, Tuple
+from src.models import _kernels
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
 
 class SimilarityComputer:
     """Compute similarity between tracks based on audio features."""
@@ -63,32 +69,94 @@ class SimilarityComputer:
         Returns:
             Weighted feature matrix
         """
-        weights = np.array([
+        return feature_matrix * self.weight_vector(feature_names)
+    
+    def weight_vector(self, feature_names: List[str]) -> np.ndarray:
+        """Per-column float32 weights for feature_names (1.0 for unlisted features)."""
+        return np.array([
             self.feature_weights.get(name, 1.0) 
             for name in feature_names
-        ])
+        ], dtype=np.float32)
+    
+    @staticmethod
+    def row_norms(feature_matrix: np.ndarray) -> np.ndarray:
+        """
+        L2 norm of each row.
         
-        return feature_matrix * weights
+        Args:
+            feature_matrix: Matrix of shape (n_samples, n_features)
+            
+        Returns:
+            Norms of shape (n_samples,)
+        """
+        return np.sqrt(np.einsum('ij,ij->i', feature_matrix, feature_matrix))
+    
+    @staticmethod
+    def normalize_rows(feature_matrix: np.ndarray,
+                       row_norms: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Scale each row to unit L2 norm (all-zero rows are left as zeros).
+        
+        Args:
+            feature_matrix: Matrix of shape (n_samples, n_features)
+            row_norms: Precomputed norms from row_norms(), if available
+            
+        Returns:
+            Row-normalized float32 matrix, C-contiguous
+        """
+        if row_norms is None:
+            row_norms = SimilarityComputer.row_norms(feature_matrix)
+        unit = feature_matrix / np.maximum(row_norms, 1e-12)[:, None]
+        return np.ascontiguousarray(unit, dtype=np.float32)
     
     def compute_similarity(self, query_vector: np.ndarray, 
-                          feature_matrix: np.ndarray) -> np.ndarray:
+                          feature_matrix: np.ndarray,
+                          matrix_is_unit: bool = False,
+                          row_norms: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Compute cosine similarity between query and all tracks.
         
         Args:
             query_vector: Feature vector of shape (n_features,)
             feature_matrix: Matrix of shape (n_samples, n_features)
+            matrix_is_unit: Rows of feature_matrix already have unit L2 norm
+                            (see normalize_rows), so a single GEMV suffices
+            row_norms: Precomputed row_norms(feature_matrix); skips the norm pass
             
         Returns:
             Similarity scores of shape (n_samples,)
         """
-        # Reshape query vector to 2D
-        query_2d = query_vector.reshape(1, -1)
+        if matrix_is_unit:
+            query_norm = np.sqrt(np.dot(query_vector, query_vector))
+            if query_norm == 0:
+                return np.zeros(len(feature_matrix), dtype=feature_matrix.dtype)
+            query_unit = (query_vector / query_norm).astype(feature_matrix.dtype, copy=False)
+            return feature_matrix @ query_unit
         
-        # Compute cosine similarity
-        similarities = cosine_similarity(query_2d, feature_matrix)[0]
+        # Known denominators: one GEMV plus an elementwise divide
+        if row_norms is not None:
+            return self._cosine_numpy(query_vector, feature_matrix, row_norms)
         
-        return similarities
+        # SIMD cosine kernels for float32 rows
+        if (simsimd is not None and feature_matrix.dtype == np.float32
+                and feature_matrix.flags['C_CONTIGUOUS']):
+            query_2d = np.ascontiguousarray(query_vector, dtype=np.float32).reshape(1, -1)
+            distances = np.asarray(simsimd.cdist(query_2d, feature_matrix, metric='cosine'))
+            return 1.0 - distances[0]
+        
+        # Single-pass compiled kernel when numba is available
+        if _kernels.HAS_NUMBA:
+            return _kernels.cosine_scores(feature_matrix, query_vector)
+        
+        return self._cosine_numpy(query_vector, feature_matrix, self.row_norms(feature_matrix))
+    
+    @staticmethod
+    def _cosine_numpy(query_vector: np.ndarray, feature_matrix: np.ndarray,
+                      row_norms: np.ndarray) -> np.ndarray:
+        """Cosine scores from a GEMV and known row norms (zero rows score 0)."""
+        dots = np.einsum('ij,j->i', feature_matrix, query_vector)
+        query_norm = np.sqrt(np.vdot(query_vector, query_vector))
+        return dots / (row_norms * query_norm + 1e-12)
     
     def compute_pairwise_similarity(self, 
                                    feature_matrix: np.ndarray) -> np.ndarray:
@@ -106,7 +174,8 @@ class SimilarityComputer:
     def get_top_k_similar(self, query_vector: np.ndarray,
                          feature_matrix: np.ndarray,
                          k: int = 50,
-                         exclude_indices: Optional[List[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+                         exclude_indices: Optional[List[int]] = None,
+                         matrix_is_unit: bool = False) -> Tuple[np.ndarray, np.ndarray]:
         """
         Get top-K most similar tracks.
         
@@ -114,20 +183,34 @@ class SimilarityComputer:
             query_vector: Feature vector of query track
             feature_matrix: Matrix of all track features
             k: Number of similar tracks to return
-            exclude_indices: Indices to exclude from results (e.g., the query track itself)
+            exclude_indices: Indices never returned (e.g., the query track itself)
+            matrix_is_unit: Rows of feature_matrix already have unit L2 norm
             
         Returns:
-            Tuple of (indices, similarity_scores) for top-K similar tracks
+            Tuple of (indices, similarity_scores) for top-K similar tracks;
+            fewer than k when exclusions leave fewer rows
         """
+        # Fused score + exclude + top-K pass over unit rows (NumPy if no numba)
+        if matrix_is_unit:
+            query_norm = np.sqrt(np.dot(query_vector, query_vector))
+            query_unit = query_vector / query_norm if query_norm > 0 else query_vector
+            exclude = np.asarray(exclude_indices or [], dtype=np.int64)
+            return _kernels.topk_cosine(feature_matrix, query_unit, k, exclude)
+        
         # Compute similarities
         similarities = self.compute_similarity(query_vector, feature_matrix)
         
-        # Exclude specified indices
+        # Excluded indices can never rank, and are dropped below
         if exclude_indices:
-            similarities[exclude_indices] = -1
+            similarities[exclude_indices] = -np.inf
         
-        # Get top-K indices
-        top_k_indices = np.argsort(similarities)[::-1][:k]
+        # Get top-K indices: O(N) partition, then sort only the K survivors
+        if k < len(similarities):
+            candidates = np.argpartition(-similarities, k)[:k]
+        else:
+            candidates = np.arange(len(similarities))
+        top_k_indices = candidates[np.argsort(-similarities[candidates])]
+        top_k_indices = top_k_indices[similarities[top_k_indices] > -np.inf]
         top_k_scores = similarities[top_k_indices]
         
         return top_k_indices, top_k_scores
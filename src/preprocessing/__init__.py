@@ -0,0 +1,6 @@
+import pandas as pd
+
+# Copy-on-Write lets the cleaner and engineer work on shallow copies without
+# touching the caller's frame (always enabled from pandas 3.0)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
@@ -5,6 +5,10 @@ Data cleaning module for Spotify dataset.
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional
+from src.data.schema import AUDIO_FEATURES, TRACK_DTYPES
+
+# Valid track durations in ms (10 seconds to 30 minutes)
+DURATION_RANGE_MS = (10000, 1800000)
 
 class DataCleaner:
     """Clean and validate Spotify track data."""
@@ -25,8 +29,9 @@ class DataCleaner:
         print("Starting data cleaning...")
         original_count = len(df)
         
-        # Make a copy to avoid modifying original
-        df_clean = df.copy()
+        # Shallow copy: with Copy-on-Write, column data is only duplicated
+        # when a step actually modifies it, so the original is never touched
+        df_clean = df.copy(deep=False)
         
         # 1. Handle missing values
         df_clean = self._handle_missing_values(df_clean)
@@ -65,11 +70,8 @@ class DataCleaner:
                 print(f"    Filled {missing_names} missing track names")
         
         # For audio features, drop rows with missing values (should be none based on exploration)
-        audio_features = ['danceability', 'energy', 'loudness', 'speechiness', 
-                         'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo']
-        
         before_count = len(df)
-        df = df.dropna(subset=audio_features)
+        df = df.dropna(subset=AUDIO_FEATURES)
         dropped = before_count - len(df)
         if dropped > 0:
             print(f"    Dropped {dropped} rows with missing audio features")
@@ -95,39 +97,42 @@ class DataCleaner:
         """Handle outliers in audio features."""
         print("  - Handling outliers...")
         
+        # Build one keep-mask and slice once
+        keep = np.ones(len(df), dtype=bool)
+        
         # For tempo, remove tracks with tempo = 0 (likely errors)
         if 'tempo' in df.columns:
-            before_count = len(df)
-            df = df[df['tempo'] > 0]
-            removed = before_count - len(df)
+            keep &= df['tempo'].to_numpy() > 0
+            removed = len(df) - keep.sum()
             if removed > 0:
                 print(f"    Removed {removed} tracks with invalid tempo (0)")
         
         # For duration, remove extremely short tracks (< 10 seconds) or very long (> 30 minutes)
         if 'duration_ms' in df.columns:
-            before_count = len(df)
-            df = df[(df['duration_ms'] >= 10000) & (df['duration_ms'] <= 1800000)]
-            removed = before_count - len(df)
+            before_count = keep.sum()
+            duration = df['duration_ms'].to_numpy()
+            keep &= (duration >= DURATION_RANGE_MS[0]) & (duration <= DURATION_RANGE_MS[1])
+            removed = before_count - keep.sum()
             if removed > 0:
                 print(f"    Removed {removed} tracks with invalid duration")
         
+        if not keep.all():
+            df = df.loc[keep]
+        
         return df
     
     def _validate_types(self, df: pd.DataFrame) -> pd.DataFrame:
         """Validate and convert data types."""
         print("  - Validating data types...")
         
-        # Ensure audio features are float
-        audio_features = ['danceability', 'energy', 'loudness', 'speechiness', 
-                         'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo']
-        
-        for feature in audio_features:
+        # Ensure audio features are float (float32 is ample for these ranges)
+        for feature in AUDIO_FEATURES:
             if feature in df.columns:
-                df[feature] = pd.to_numeric(df[feature], errors='coerce')
+                df[feature] = pd.to_numeric(df[feature], errors='coerce').astype(np.float32)
         
-        # Ensure popularity is int
+        # Ensure popularity is int (0-100)
         if 'popularity' in df.columns:
-            df['popularity'] = pd.to_numeric(df['popularity'], errors='coerce').fillna(0).astype(int)
+            df['popularity'] = pd.to_numeric(df['popularity'], errors='coerce').fillna(0).astype(np.int16)
         
         return df
     
@@ -138,7 +143,7 @@ class DataCleaner:
 
 if __name__ == "__main__":
     # Test the cleaner
-    df = pd.read_csv('data/raw/tracks.csv')
+    df = pd.read_csv('data/raw/tracks.csv', dtype=TRACK_DTYPES, engine='pyarrow')
     cleaner = DataCleaner()
     df_clean = cleaner.clean(df)
     print(f"\nCleaning report: {cleaner.get_cleaning_report()}")
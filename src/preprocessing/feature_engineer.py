@@ -2,11 +2,48 @@
 Feature engineering module for Spotify dataset.
 """
 
+import functools
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
 from typing import Dict, List
-import json
+import orjson
+from src.data.schema import TRACK_DTYPES
+from src.preprocessing.data_cleaner import DataCleaner
+
+# Reference year for track_age
+CURRENT_YEAR = 2024
+
+# Features clipped to a typical range and scaled to [0, 1] as <feature>_normalized
+NORMALIZATION_RANGES = {
+    'loudness': (-60, 0),
+    'tempo': (0, 250),
+}
+
+# Left edges of the release eras after 'vintage'; each era includes its edge year
+ERA_BINS = (1960, 1980, 2000, 2010, 2020)
+ERA_LABELS = ('vintage', '60s-70s', '80s-90s', '2000s', '2010s', '2020s')
+
+# Inputs to the derived features, in block column order
+DERIVED_INPUTS = ('danceability', 'energy', 'valence', 'acousticness',
+                  'instrumentalness', 'loudness_normalized')
+
+# Derived feature -> (NumPy expression over the input columns, inputs it needs)
+DERIVED_FEATURES = {
+    # Energy-Danceability (party factor)
+    'energy_danceability': ('energy * danceability', ('energy', 'danceability')),
+    # Mood score (combination of valence and energy)
+    'mood_score': ('(valence + energy) * 0.5', ('valence', 'energy')),
+    # Acoustic ratio (clip extreme values)
+    'acoustic_ratio': ('np.clip(acousticness / (1 - instrumentalness + 0.001), 0, 10)',
+                       ('acousticness', 'instrumentalness')),
+    # Vocal presence (inverse of instrumentalness)
+    'vocal_presence': ('1 - instrumentalness', ('instrumentalness',)),
+    # Intensity score (energy + loudness)
+    'intensity': ('(energy + loudness_normalized) * 0.5', ('energy', 'loudness_normalized')),
+    # Chill factor (low energy, high acousticness)
+    'chill_factor': ('(1 - energy) * acousticness', ('energy', 'acousticness')),
+}
 
 class FeatureEngineer:
     """Engineer features for music recommendation."""
@@ -14,6 +51,9 @@ class FeatureEngineer:
     def __init__(self):
         self.scalers = {}
         self.feature_metadata = {}
+        # Dataset-wide temporal statistics ('median_year', 'max_track_age',
+        # 'date_format'); when unset they are computed from the frame being engineered
+        self.temporal_stats = {}
     
     def engineer_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -27,7 +67,8 @@ class FeatureEngineer:
         """
         print("Starting feature engineering...")
         
-        df_engineered = df.copy()
+        # Shallow copy; new columns are added without duplicating existing ones
+        df_engineered = df.copy(deep=False)
         
         # 1. Normalize audio features
         df_engineered = self._normalize_features(df_engineered)
@@ -54,12 +95,7 @@ class FeatureEngineer:
                               'acousticness', 'instrumentalness', 'liveness', 'valence']
         
         # Features that need normalization
-        features_to_scale = {
-            'loudness': (-60, 0),  # Typical range
-            'tempo': (0, 250),      # Typical range
-        }
-        
-        for feature, (min_val, max_val) in features_to_scale.items():
+        for feature, (min_val, max_val) in NORMALIZATION_RANGES.items():
             if feature in df.columns:
                 # Clip to expected range and normalize
                 df[f'{feature}_normalized'] = df[feature].clip(min_val, max_val)
@@ -71,33 +107,38 @@ class FeatureEngineer:
         """Create derived features from existing ones."""
         print("  - Creating derived features...")
         
-        # Energy-Danceability (party factor)
-        if 'energy' in df.columns and 'danceability' in df.columns:
-            df['energy_danceability'] = df['energy'] * df['danceability']
-        
-        # Mood score (combination of valence and energy)
-        if 'valence' in df.columns and 'energy' in df.columns:
-            df['mood_score'] = (df['valence'] + df['energy']) / 2
-        
-        # Acoustic ratio
-        if 'acousticness' in df.columns and 'instrumentalness' in df.columns:
-            df['acoustic_ratio'] = df['acousticness'] / (1 - df['instrumentalness'] + 0.001)
-            df['acoustic_ratio'] = df['acoustic_ratio'].clip(0, 10)  # Clip extreme values
-        
-        # Vocal presence (inverse of instrumentalness)
-        if 'instrumentalness' in df.columns:
-            df['vocal_presence'] = 1 - df['instrumentalness']
-        
-        # Intensity score (energy + loudness)
-        if 'energy' in df.columns and 'loudness_normalized' in df.columns:
-            df['intensity'] = (df['energy'] + df['loudness_normalized']) / 2
+        # Pull the inputs into one float32 block and derive every column from it
+        inputs = tuple(c for c in DERIVED_INPUTS if c in df.columns)
+        block = df[list(inputs)].to_numpy(dtype=np.float32)
         
-        # Chill factor (low energy, high acousticness)
-        if 'energy' in df.columns and 'acousticness' in df.columns:
-            df['chill_factor'] = (1 - df['energy']) * df['acousticness']
+        for name, values in self._derived_kernel(inputs)(block).items():
+            df[name] = values
         
         return df
     
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _derived_kernel(inputs: tuple):
+        """
+        Compile a function computing every derived feature available from inputs.
+        
+        The source is generated once per input set, binding each block column
+        to a local name and inlining the DERIVED_FEATURES expressions, so the
+        per-call work is plain NumPy arithmetic with no column lookups or
+        availability checks.
+        """
+        lines = ['def _derive(block):']
+        lines += [f'    {name} = block[:, {i}]' for i, name in enumerate(inputs)]
+        lines.append('    return {')
+        lines += [f'        {name!r}: {expression},'
+                  for name, (expression, needs) in DERIVED_FEATURES.items()
+                  if set(needs) <= set(inputs)]
+        lines.append('    }')
+        
+        namespace = {'np': np}
+        exec(compile('\n'.join(lines), '<derived_features>', 'exec'), namespace)
+        return namespace['_derive']
+    
     def _create_temporal_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Create temporal features from release date."""
         print("  - Creating temporal features...")
@@ -106,41 +147,34 @@ class FeatureEngineer:
             return df
         
         # Parse release date (handle different formats)
-        df['release_date_parsed'] = pd.to_datetime(df['release_date'], errors='coerce')
+        df['release_date_parsed'] = pd.to_datetime(
+            df['release_date'], format=self.temporal_stats.get('date_format'), errors='coerce'
+        )
         
         # Extract year
         df['release_year'] = df['release_date_parsed'].dt.year
         
         # Handle missing years (use median year)
-        median_year = df['release_year'].median()
-        df['release_year'] = df['release_year'].fillna(median_year).astype(int)
+        median_year = self.temporal_stats.get('median_year', df['release_year'].median())
+        df['release_year'] = df['release_year'].fillna(median_year).astype(np.int16)
         
         # Create decade
-        df['release_decade'] = (df['release_year'] // 10) * 10
+        df['release_decade'] = (df['release_year'] // 10 * 10).astype(np.int16)
         
         # Create era categories
-        def categorize_era(year):
-            if year < 1960:
-                return 'vintage'
-            elif year < 1980:
-                return '60s-70s'
-            elif year < 2000:
-                return '80s-90s'
-            elif year < 2010:
-                return '2000s'
-            elif year < 2020:
-                return '2010s'
-            else:
-                return '2020s'
-        
-        df['release_era'] = df['release_year'].apply(categorize_era)
+        df['release_era'] = pd.cut(
+            df['release_year'],
+            bins=[-np.inf, *ERA_BINS, np.inf],
+            labels=list(ERA_LABELS),
+            right=False
+        )
         
         # Track age (years since release)
-        current_year = 2024
-        df['track_age'] = current_year - df['release_year']
+        df['track_age'] = CURRENT_YEAR - df['release_year']
         
         # Normalize track age
-        df['track_age_normalized'] = df['track_age'] / df['track_age'].max()
+        max_track_age = self.temporal_stats.get('max_track_age', df['track_age'].max())
+        df['track_age_normalized'] = df['track_age'] / max_track_age
         
         return df
     
@@ -158,7 +192,15 @@ class FeatureEngineer:
     
     def get_feature_columns(self, df: pd.DataFrame) -> Dict[str, List[str]]:
         """Get categorized feature columns."""
-        
+        return {
+            category: list(features)
+            for category, features in self._feature_columns_for(tuple(df.columns))
+        }
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _feature_columns_for(columns: tuple) -> tuple:
+        """Categorized feature columns for a column set (cached, immutable)."""
         original_audio_features = [
             'danceability', 'energy', 'key', 'loudness', 'mode', 
             'speechiness', 'acousticness', 'instrumentalness', 
@@ -179,12 +221,13 @@ class FeatureEngineer:
         ]
         
         # Filter to only include columns that exist in the dataframe
-        return {
-            'original_audio': [f for f in original_audio_features if f in df.columns],
-            'normalized': [f for f in normalized_features if f in df.columns],
-            'derived': [f for f in derived_features if f in df.columns],
-            'temporal': [f for f in temporal_features if f in df.columns]
-        }
+        present = set(columns)
+        return (
+            ('original_audio', tuple(f for f in original_audio_features if f in present)),
+            ('normalized', tuple(f for f in normalized_features if f in present)),
+            ('derived', tuple(f for f in derived_features if f in present)),
+            ('temporal', tuple(f for f in temporal_features if f in present))
+        )
     
     def save_feature_metadata(self, df: pd.DataFrame, filepath: str):
         """Save feature metadata to JSON."""
@@ -210,18 +253,17 @@ class FeatureEngineer:
                     'max': float(df[feature].max())
                 }
         
-        with open(filepath, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(metadata, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
         
         print(f"Feature metadata saved to {filepath}")
 
 
 if __name__ == "__main__":
     # Test the feature engineer
-    df = pd.read_csv('data/raw/tracks.csv')
+    df = pd.read_csv('data/raw/tracks.csv', dtype=TRACK_DTYPES, engine='pyarrow')
     
     # Clean first
-    from data_cleaner import DataCleaner
     cleaner = DataCleaner()
     df_clean = cleaner.clean(df)
     
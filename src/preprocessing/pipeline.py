@@ -3,9 +3,50 @@ Preprocessing pipeline for Spotify dataset.
 """
 
 import pandas as pd
+import numpy as np
+import gc
+import hashlib
+import inspect
+import logging
+import orjson
 import os
-from src.preprocessing.data_cleaner import DataCleaner
-from src.preprocessing.feature_engineer import FeatureEngineer
+import pathlib
+import pickle
+import shutil
+import sys
+import types
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from joblib import Parallel, delayed, effective_n_jobs
+from pandas.tseries.api import guess_datetime_format
+from src.data.schema import AUDIO_FEATURES, TEXT_COLUMNS, TRACK_DTYPES
+from src.preprocessing.data_cleaner import DataCleaner, DURATION_RANGE_MS
+from src.preprocessing.feature_engineer import (
+    FeatureEngineer, CURRENT_YEAR, DERIVED_FEATURES, ERA_BINS, ERA_LABELS, NORMALIZATION_RANGES
+)
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+logger = logging.getLogger(__name__)
+
+# Explicit raw-CSV schema so the reader skips type inference
+RAW_DTYPES = {
+    **{column: 'str' for column in TEXT_COLUMNS},
+    **TRACK_DTYPES,
+}
+
+# Cleaner/engineer attributes that record a previous run rather than configure
+# the next one; left out of the cache key
+RUN_STATE_ATTRIBUTES = {'cleaning_stats', 'feature_metadata'}
+
+# NumPy functions used in DERIVED_FEATURES expressions, as polars expression
+# methods, so run_lazy evaluates the same expressions over pl.col() inputs
+POLARS_NUMPY = types.SimpleNamespace(clip=lambda expr, low, high: expr.clip(low, high))
 
 class PreprocessingPipeline:
     """Orchestrate data cleaning and feature engineering."""
@@ -17,105 +58,553 @@ class PreprocessingPipeline:
         self.cleaner = DataCleaner()
         self.engineer = FeatureEngineer()
         
-        # Ensure output directory exists
-        os.makedirs(output_dir, exist_ok=True)
+        # Output locations; the directory is created on first write
+        base = pathlib.Path(output_dir)
+        self.clean_path = base / 'tracks_cleaned.parquet'
+        self.output_path = base / 'tracks_processed.parquet'
+        self.metadata_path = base / 'feature_metadata.json'
+        self.report_path = base / 'preprocessing_report.json'
+        self.cache_dir = base / 'cache'
+        self._dir_ready = False
     
-    def run(self, save_intermediate: bool = False) -> pd.DataFrame:
+    def run(self, save_intermediate: bool = False,
+            legacy_csv: bool = False, use_cache: bool = True,
+            n_jobs: int = 1) -> pd.DataFrame:
         """
         Run the complete preprocessing pipeline.
         
         Args:
             save_intermediate: Whether to save intermediate results
+            legacy_csv: Also write CSV copies of the outputs for older consumers
+            use_cache: Restore the outputs of an earlier run on the same input,
+                code and settings (kept under output_dir/cache) instead of
+                recomputing them; only the latest run's entry is kept
+            n_jobs: Worker processes for cleaning and feature engineering
+                (-1 for all cores); results match the single-process run
             
         Returns:
             Processed dataframe
         """
-        print("=" * 80)
-        print("PREPROCESSING PIPELINE")
-        print("=" * 80)
+        logger.info("%s\nPREPROCESSING PIPELINE\n%s", "=" * 80, "=" * 80)
+        
+        if use_cache:
+            cache_key = self._cache_key()
+            cache_files = self._cache_files(cache_key, save_intermediate)
+            if all(cached.exists() for cached in cache_files.values()):
+                return self._restore_cached(cache_files, legacy_csv)
         
         # 1. Load raw data
-        print("\n1. Loading raw data...")
-        df_raw = pd.read_csv(self.raw_data_path)
-        print(f"   Loaded {len(df_raw):,} tracks")
+        logger.info("\n1. Loading raw data...")
+        df_raw = self._load_raw()
+        raw_stats = {'rows': len(df_raw), 'cols': len(df_raw.columns)}
+        logger.info("   Loaded %s tracks", format(raw_stats['rows'], ','))
         
         # 2. Clean data
-        print("\n2. Cleaning data...")
-        df_clean = self.cleaner.clean(df_raw)
+        logger.info("\n2. Cleaning data...")
+        if n_jobs == 1:
+            df_clean = self.cleaner.clean(df_raw)
+        else:
+            df_clean = self._clean_parallel(df_raw, n_jobs)
+        clean_stats = {'rows': len(df_clean), 'cols': len(df_clean.columns)}
+        # Only the counts are needed from here on; collect now so pandas'
+        # internal reference cycles don't keep the raw frame alive
+        del df_raw
+        gc.collect()
         
-        if save_intermediate:
-            clean_path = os.path.join(self.output_dir, 'tracks_cleaned.csv')
-            df_clean.to_csv(clean_path, index=False)
-            print(f"   Saved cleaned data to {clean_path}")
+        self._ensure_output_dir()
+        # Background writers, shut down before run() returns; Arrow releases
+        # the GIL while encoding/writing
+        with ThreadPoolExecutor(max_workers=2) as io_pool:
+            pending_writes = []
+            if save_intermediate:
+                # Overlaps with feature engineering, which only adds new columns
+                pending_writes.append(
+                    io_pool.submit(self._save_frame, df_clean, self.clean_path, legacy_csv)
+                )
+                logger.info("   Saving cleaned data to %s in the background", self.clean_path)
+            
+            # 3. Engineer features
+            logger.info("\n3. Engineering features...")
+            if n_jobs == 1:
+                df_processed = self.engineer.engineer_features(df_clean)
+            else:
+                df_processed = self._engineer_parallel(df_clean, n_jobs)
+            del df_clean
+            gc.collect()
+            
+            # 4. Save processed data
+            logger.info("\n4. Saving processed data...")
+            pending_writes.append(
+                io_pool.submit(self._save_frame, df_processed, self.output_path, legacy_csv)
+            )
+            logger.info("   Saving to %s in the background", self.output_path)
+            
+            # 5. Save feature metadata
+            self.engineer.save_feature_metadata(df_processed, self.metadata_path)
+            
+            # 6. Generate summary report
+            processed_stats = {'rows': len(df_processed), 'cols': len(df_processed.columns)}
+            self._generate_report(raw_stats, clean_stats, processed_stats,
+                                  self.engineer.get_feature_columns(df_processed))
+            
+            # Wait for background writes and surface any errors
+            for future in pending_writes:
+                future.result()
+        
+        if use_cache:
+            self._store_cached(cache_key, cache_files)
+        
+        logger.info("\n%s\nPREPROCESSING COMPLETE\n%s", "=" * 80, "=" * 80)
+        
+        return df_processed
+    
+    def _clean_parallel(self, df_raw: pd.DataFrame, n_jobs: int) -> pd.DataFrame:
+        """
+        Clean contiguous row partitions in worker processes.
+        
+        Repeated IDs are dropped up front, with the same keep-first rule the
+        cleaner applies to rows that have every audio feature, so no
+        duplicate straddles a partition boundary. The partitions are
+        positional slices (views, not copies) and come back in input order,
+        so the concatenated result needs no re-sort.
+        """
+        original_count = len(df_raw)
+        df_raw = self._drop_repeated_ids(df_raw, set())
+        
+        cleaned = Parallel(n_jobs=n_jobs, backend='loky')(
+            delayed(self.cleaner.clean)(df_raw.iloc[start:stop])
+            for start, stop in self._partition_bounds(len(df_raw), n_jobs)
+        )
+        df_clean = pd.concat(cleaned)
+        
+        # Cleaning stats for the whole frame
+        final_count = len(df_clean)
+        self.cleaner.cleaning_stats = {
+            'original_count': original_count,
+            'final_count': final_count,
+            'removed_count': original_count - final_count,
+            'removal_percentage': ((original_count - final_count) / original_count) * 100
+        }
+        return df_clean
+    
+    def _engineer_parallel(self, df_clean: pd.DataFrame, n_jobs: int) -> pd.DataFrame:
+        """
+        Engineer features for contiguous row partitions in worker processes.
         
-        # 3. Engineer features
-        print("\n3. Engineering features...")
-        df_processed = self.engineer.engineer_features(df_clean)
+        Dataset-wide temporal statistics, including the release-date format
+        pandas would infer for the whole column, are fixed up front so each
+        partition computes the same values as a single-process run.
+        """
+        if 'release_date' in df_clean.columns:
+            dates = df_clean['release_date']
+            date_format = self._infer_date_format(dates)
+            years = pd.to_datetime(dates, format=date_format, errors='coerce').dt.year
+            self.engineer.temporal_stats = {
+                **self._temporal_stats(years.to_numpy(dtype=np.float64)),
+                'date_format': date_format
+            }
         
-        # 4. Save processed data
-        print("\n4. Saving processed data...")
-        output_path = os.path.join(self.output_dir, 'tracks_processed.csv')
-        df_processed.to_csv(output_path, index=False)
-        print(f"   Saved to {output_path}")
+        try:
+            engineered = Parallel(n_jobs=n_jobs, backend='loky')(
+                delayed(self.engineer.engineer_features)(df_clean.iloc[start:stop])
+                for start, stop in self._partition_bounds(len(df_clean), n_jobs)
+            )
+        finally:
+            self.engineer.temporal_stats = {}
+        return pd.concat(engineered)
+    
+    @staticmethod
+    def _drop_repeated_ids(df: pd.DataFrame, seen_ids: set) -> pd.DataFrame:
+        """
+        Drop rows whose ID appeared earlier, by the cleaner's keep-first rule.
         
-        # 5. Save feature metadata
-        metadata_path = os.path.join(self.output_dir, 'feature_metadata.json')
-        self.engineer.save_feature_metadata(df_processed, metadata_path)
+        Only rows with every audio feature count, since the cleaner drops the
+        others before deduplicating, and this runs before outlier filtering
+        just as the cleaner's own dedupe does. seen_ids carries the IDs kept
+        so far across calls and is updated in place.
+        """
+        complete = df[AUDIO_FEATURES].notna().all(axis=1).to_numpy()
+        ids = df['id'].iloc[complete]
+        repeated = np.zeros(len(df), dtype=bool)
+        repeated[complete] = (ids.duplicated() | ids.isin(seen_ids)).to_numpy()
+        seen_ids.update(ids.tolist())
+        return df[~repeated] if repeated.any() else df
+    
+    @staticmethod
+    def _infer_date_format(dates: pd.Series) -> Optional[str]:
+        """The format pd.to_datetime infers for dates (from its first non-null value)."""
+        first = dates.first_valid_index()
+        return guess_datetime_format(dates[first]) if first is not None else None
+    
+    @staticmethod
+    def _partition_bounds(n_rows: int, n_jobs: int) -> list:
+        """(start, stop) row ranges splitting n_rows evenly across the workers."""
+        bounds = np.linspace(0, n_rows, effective_n_jobs(n_jobs) + 1, dtype=np.int64)
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+    
+    @staticmethod
+    def _temporal_stats(years: np.ndarray) -> dict:
+        """Median release year and maximum track age from float years (NaN = unknown)."""
+        median_year = np.nanmedian(years)
+        filled = np.where(np.isnan(years), median_year, years).astype(np.int16)
+        return {
+            'median_year': median_year,
+            'max_track_age': CURRENT_YEAR - int(filled.min())
+        }
+    
+    def _cache_key(self) -> str:
+        """
+        Hash the raw input and everything that shapes the outputs into a cache key.
         
-        # 6. Generate summary report
-        self._generate_report(df_raw, df_clean, df_processed)
+        Covers the first MiB of the raw file plus its size and modification
+        time, the source of the pipeline, cleaner, engineer and schema
+        modules, and the cleaner/engineer settings (their attributes apart
+        from RUN_STATE_ATTRIBUTES), so editing either changes the key.
+        """
+        stat = os.stat(self.raw_data_path)
+        with open(self.raw_data_path, 'rb') as f:
+            head = f.read(1 << 20)
         
-        print("\n" + "=" * 80)
-        print("PREPROCESSING COMPLETE")
-        print("=" * 80)
+        # Sorted by content, so the key doesn't depend on module names ('__main__')
+        modules = {sys.modules[name] for name in (__name__, 'src.data.schema',
+                                                  type(self.cleaner).__module__,
+                                                  type(self.engineer).__module__)}
+        sources = sorted(inspect.getsource(module) for module in modules)
+        settings = {
+            name: {key: value for key, value in vars(component).items()
+                   if key not in RUN_STATE_ATTRIBUTES}
+            for name, component in (('cleaner', self.cleaner), ('engineer', self.engineer))
+        }
+        
+        digest = hashlib.blake2b(head, digest_size=8)
+        digest.update(pickle.dumps((stat.st_size, stat.st_mtime_ns, sources, settings)))
+        return digest.hexdigest()
+    
+    def _cache_files(self, cache_key: str, save_intermediate: bool) -> dict:
+        """Output path -> its copy in the cache entry for cache_key."""
+        files = {
+            self.output_path: self.cache_dir / f'{cache_key}.parquet',
+            self.metadata_path: self.cache_dir / f'{cache_key}.metadata.json',
+            self.report_path: self.cache_dir / f'{cache_key}.report.json',
+        }
+        if save_intermediate:
+            files[self.clean_path] = self.cache_dir / f'{cache_key}.cleaned.parquet'
+        return files
+    
+    def _store_cached(self, cache_key: str, cache_files: dict):
+        """Copy this run's outputs into the cache, keeping only its entry."""
+        self.cache_dir.mkdir(exist_ok=True)
+        for output, cached in cache_files.items():
+            shutil.copyfile(output, cached)
+        
+        # Entries for older inputs, code or settings are full copies of the
+        # dataset and are never hit again once any of those change
+        for path in self.cache_dir.iterdir():
+            if not path.name.startswith(f'{cache_key}.'):
+                path.unlink()
+    
+    def _restore_cached(self, cache_files: dict, legacy_csv: bool) -> pd.DataFrame:
+        """Put a cached run's outputs back in place and return its processed frame."""
+        logger.info("\nUsing cached pipeline output %s", cache_files[self.output_path])
+        self._ensure_output_dir()
+        for output, cached in cache_files.items():
+            shutil.copyfile(cached, output)
+        
+        self.cleaner.cleaning_stats = orjson.loads(self.report_path.read_bytes())['cleaning_stats']
+        df_processed = pd.read_parquet(self.output_path, engine='pyarrow')
+        if legacy_csv:
+            df_processed.to_csv(self.output_path.with_suffix('.csv'), index=False)
+            if self.clean_path in cache_files:
+                pd.read_parquet(self.clean_path, engine='pyarrow').to_csv(
+                    self.clean_path.with_suffix('.csv'), index=False
+                )
         
         return df_processed
     
-    def _generate_report(self, df_raw: pd.DataFrame, 
-                        df_clean: pd.DataFrame, 
-                        df_processed: pd.DataFrame):
-        """Generate a summary report of the preprocessing."""
+    def _load_raw(self) -> pd.DataFrame:
+        """
+        Load the raw tracks CSV, reusing a Parquet copy parsed on an earlier run.
+        
+        The copy lives next to the CSV (tracks.csv -> tracks.parquet) and is
+        only used while it is at least as new as the CSV.
+        """
+        cache_path = os.path.splitext(self.raw_data_path)[0] + '.parquet'
+        if (os.path.exists(cache_path)
+                and os.path.getmtime(cache_path) >= os.path.getmtime(self.raw_data_path)):
+            logger.info("   Using cached parse %s", cache_path)
+            if pl is not None:
+                return pl.read_parquet(cache_path, use_statistics=True).to_pandas()
+            return pd.read_parquet(cache_path, engine='pyarrow')
+        
+        df = self._parse_raw_csv()
+        try:
+            df.to_parquet(cache_path, compression='zstd', engine='pyarrow', index=False)
+        except OSError as e:
+            logger.info("   Could not cache parsed data to %s: %s", cache_path, e)
+        
+        return df
+    
+    def _parse_raw_csv(self) -> pd.DataFrame:
+        """Parse the raw tracks CSV with a multi-threaded reader."""
+        if pl is not None:
+            return pl.scan_csv(
+                self.raw_data_path, schema_overrides=self._polars_schema()
+            ).collect().to_pandas()
+        
+        return pd.read_csv(self.raw_data_path, dtype=RAW_DTYPES, engine='pyarrow')
+    
+    @staticmethod
+    def _polars_schema() -> dict:
+        """RAW_DTYPES as polars dtypes."""
+        polars_dtypes = {'str': pl.String, 'float32': pl.Float32, 'int8': pl.Int8,
+                         'int16': pl.Int16, 'int32': pl.Int32}
+        return {col: polars_dtypes[dtype] for col, dtype in RAW_DTYPES.items()}
+    
+    def run_lazy(self) -> pathlib.Path:
+        """
+        Clean and engineer features as one polars lazy query, streamed to Parquet.
+        
+        Applies the same rules as DataCleaner and FeatureEngineer (built from
+        their shared constants and DERIVED_FEATURES expressions), but lets
+        polars push the row filters down into the CSV scan and run the column
+        expressions in parallel, without materializing the cleaned frame.
+        Release dates are parsed per value (YYYY, YYYY-MM or YYYY-MM-DD), so
+        mixed-format dates all resolve to a year. No cleaning report is written.
+        
+        Returns:
+            Path of the processed Parquet file
+        """
+        if pl is None:
+            raise RuntimeError("run_lazy requires polars; use run() instead")
+        
+        logger.info("Running lazy preprocessing pipeline...")
+        lf = pl.scan_csv(self.raw_data_path, schema_overrides=self._polars_schema())
+        columns = lf.collect_schema().names()
+        
+        # Cleaning (DataCleaner rules)
+        if 'name' in columns:
+            lf = lf.with_columns(pl.col('name').fill_null('Unknown Track'))
+        lf = lf.drop_nulls(subset=AUDIO_FEATURES).unique(subset=['id'], keep='first',
+                                                         maintain_order=True)
+        if 'tempo' in columns:
+            lf = lf.filter(pl.col('tempo') > 0)
+        if 'duration_ms' in columns:
+            lf = lf.filter(pl.col('duration_ms').is_between(*DURATION_RANGE_MS))
+        lf = lf.with_columns(pl.col(AUDIO_FEATURES).cast(pl.Float32))
+        if 'popularity' in columns:
+            lf = lf.with_columns(pl.col('popularity').fill_null(0).cast(pl.Int16))
+        
+        # Normalized and derived features (FeatureEngineer rules)
+        normalized = {
+            f'{feature}_normalized': (pl.col(feature).clip(low, high) - low) / (high - low)
+            for feature, (low, high) in NORMALIZATION_RANGES.items() if feature in columns
+        }
+        available = set(columns) | set(normalized)
+        lf = lf.with_columns(**normalized).with_columns(**{
+            name: eval(expression, {'np': POLARS_NUMPY}, {c: pl.col(c) for c in needs})
+            for name, (expression, needs) in DERIVED_FEATURES.items()
+            if set(needs) <= available
+        })
+        
+        # Temporal features
+        if 'release_date' in columns:
+            date = pl.col('release_date')
+            lf = lf.with_columns(release_date_parsed=pl.coalesce(
+                date.str.strptime(pl.Date, fmt, strict=False)
+                for fmt in ('%Y-%m-%d', '%Y-%m', '%Y')
+            ).cast(pl.Datetime)).with_columns(
+                release_year=pl.col('release_date_parsed').dt.year()
+            ).with_columns(
+                pl.col('release_year').fill_null(pl.col('release_year').median()).cast(pl.Int16)
+            ).with_columns(
+                release_decade=(pl.col('release_year') // 10 * 10).cast(pl.Int16),
+                release_era=pl.col('release_year').cut(
+                    list(ERA_BINS), labels=list(ERA_LABELS), left_closed=True
+                ),
+                track_age=(CURRENT_YEAR - pl.col('release_year')).cast(pl.Int16),
+            ).with_columns(
+                track_age_normalized=pl.col('track_age') / pl.col('track_age').max()
+            )
+        
+        if 'artists' in columns:
+            lf = lf.with_columns(
+                artist_count=(pl.col('artists').str.count_matches(',') + 1).cast(pl.Int64)
+            )
+        
+        self._ensure_output_dir()
+        lf.sink_parquet(self.output_path, compression='zstd', row_group_size=64_000)
+        logger.info("Saved processed data to %s", self.output_path)
+        
+        return self.output_path
+    
+    def run_chunked(self, chunk_size: int = 250_000) -> pathlib.Path:
+        """
+        Clean and engineer the raw CSV chunk by chunk, streaming to Parquet.
+        
+        Peak memory is bounded by one chunk rather than the whole dataset.
+        A first pass over the cleaning and date columns computes the
+        dataset-wide statistics (median release year, maximum track age and
+        the release-date format) and the rows kept, so the second pass
+        produces the same values as run(). Duplicate IDs are dropped across
+        chunk boundaries before outlier filtering, as in run().
+        
+        Args:
+            chunk_size: Number of CSV rows per chunk
+            
+        Returns:
+            Path of the processed Parquet file
+        """
+        logger.info("%s\nPREPROCESSING PIPELINE (chunked)\n%s", "=" * 80, "=" * 80)
+        
+        header = pd.read_csv(self.raw_data_path, nrows=0)
+        
+        # 1. Dataset-wide statistics from the columns cleaning and dates need
+        logger.info("\n1. Scanning raw data for dataset-wide statistics...")
+        stat_columns = ['id', *AUDIO_FEATURES, 'duration_ms', 'release_date']
+        seen_ids = set()
+        years = []
+        # Pinned from the first cleaned date, as run() infers one format for the column
+        date_format, format_fixed = None, False
+        for chunk in pd.read_csv(self.raw_data_path, chunksize=chunk_size, dtype=RAW_DTYPES,
+                                 usecols=[c for c in stat_columns if c in header.columns]):
+            chunk = self.cleaner.clean(self._drop_repeated_ids(chunk, seen_ids))
+            if 'release_date' in chunk.columns:
+                if not format_fixed and chunk['release_date'].notna().any():
+                    date_format, format_fixed = self._infer_date_format(chunk['release_date']), True
+                parsed = pd.to_datetime(chunk['release_date'], format=date_format, errors='coerce')
+                years.append(parsed.dt.year.to_numpy(dtype=np.float64))
+        
+        if years:
+            self.engineer.temporal_stats = {
+                **self._temporal_stats(np.concatenate(years)),
+                'date_format': date_format
+            }
+        
+        # 2. Clean, engineer and write each chunk
+        logger.info("\n2. Cleaning and engineering chunks...")
+        self._ensure_output_dir()
+        writer = None
+        seen_ids = set()
+        n_raw = n_clean = 0
+        c_clean = 0
+        feature_columns = None
+        try:
+            for chunk in pd.read_csv(self.raw_data_path, chunksize=chunk_size, dtype=RAW_DTYPES):
+                n_raw += len(chunk)
+                chunk = self.cleaner.clean(self._drop_repeated_ids(chunk, seen_ids))
+                n_clean += len(chunk)
+                c_clean = len(chunk.columns)
+                
+                processed = self.engineer.engineer_features(chunk)
+                feature_columns = processed.columns
+                if writer is None:
+                    table = pa.Table.from_pandas(processed, preserve_index=False)
+                    writer = pq.ParquetWriter(self.output_path, table.schema, compression='zstd')
+                else:
+                    table = pa.Table.from_pandas(processed, schema=writer.schema,
+                                                 preserve_index=False)
+                writer.write_table(table, row_group_size=64_000)
+        finally:
+            if writer is not None:
+                writer.close()
+            self.engineer.temporal_stats = {}
+        logger.info("   Saved to %s", self.output_path)
+        
+        # Cleaning stats across all chunks
+        self.cleaner.cleaning_stats = {
+            'original_count': n_raw,
+            'final_count': n_clean,
+            'removed_count': n_raw - n_clean,
+            'removal_percentage': ((n_raw - n_clean) / n_raw) * 100
+        }
+        
+        # 3. Feature metadata, reading back only the feature columns
+        if feature_columns is not None:
+            feature_categories = self.engineer.get_feature_columns(pd.DataFrame(columns=feature_columns))
+            self.engineer.save_feature_metadata(
+                pd.read_parquet(self.output_path, columns=[c for features in feature_categories.values()
+                                                      for c in features]),
+                self.metadata_path
+            )
+            
+            # 4. Summary report from running counts
+            self._generate_report({'rows': n_raw, 'cols': len(header.columns)},
+                                  {'rows': n_clean, 'cols': c_clean},
+                                  {'rows': n_clean, 'cols': len(feature_columns)},
+                                  feature_categories)
+        
+        logger.info("\n%s\nPREPROCESSING COMPLETE\n%s", "=" * 80, "=" * 80)
+        
+        return self.output_path
+    
+    def _ensure_output_dir(self):
+        """Create the output directory before the first write."""
+        if not self._dir_ready:
+            pathlib.Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+            self._dir_ready = True
+    
+    @staticmethod
+    def _save_frame(df: pd.DataFrame, parquet_path: pathlib.Path, legacy_csv: bool = False):
+        """Write df as zstd Parquet, plus a same-named CSV when legacy_csv is set."""
+        df.to_parquet(parquet_path, compression='zstd', row_group_size=64_000,
+                      engine='pyarrow', index=False)
+        if legacy_csv:
+            df.to_csv(parquet_path.with_suffix('.csv'), index=False)
+    
+    def _generate_report(self, raw_stats: dict, clean_stats: dict,
+                         processed_stats: dict, feature_categories: dict):
+        """
+        Generate a summary report of the preprocessing.
+        
+        Each *_stats dict holds the 'rows' and 'cols' counts of one stage, so
+        the stage DataFrames can be released as soon as they are done.
+        """
+        n_raw, c_raw = raw_stats['rows'], raw_stats['cols']
+        n_clean, c_clean = clean_stats['rows'], clean_stats['cols']
+        n_processed, c_processed = processed_stats['rows'], processed_stats['cols']
         
         report = {
             'raw_data': {
-                'total_tracks': len(df_raw),
-                'total_columns': len(df_raw.columns)
+                'total_tracks': n_raw,
+                'total_columns': c_raw
             },
             'cleaned_data': {
-                'total_tracks': len(df_clean),
-                'total_columns': len(df_clean.columns),
-                'tracks_removed': len(df_raw) - len(df_clean),
-                'removal_percentage': ((len(df_raw) - len(df_clean)) / len(df_raw)) * 100
+                'total_tracks': n_clean,
+                'total_columns': c_clean,
+                'tracks_removed': n_raw - n_clean,
+                'removal_percentage': ((n_raw - n_clean) / n_raw) * 100
             },
             'processed_data': {
-                'total_tracks': len(df_processed),
-                'total_columns': len(df_processed.columns),
-                'new_features_added': len(df_processed.columns) - len(df_clean.columns)
+                'total_tracks': n_processed,
+                'total_columns': c_processed,
+                'new_features_added': c_processed - c_clean
             },
             'cleaning_stats': self.cleaner.get_cleaning_report(),
-            'feature_categories': self.engineer.get_feature_columns(df_processed)
+            'feature_categories': feature_categories
         }
         
         # Save report
-        import json
-        report_path = os.path.join(self.output_dir, 'preprocessing_report.json')
-        with open(report_path, 'w') as f:
-            json.dump(report, f, indent=2)
+        self.report_path.write_bytes(
+            orjson.dumps(report, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+        )
         
-        print(f"\n5. Preprocessing report saved to {report_path}")
+        logger.info("\n5. Preprocessing report saved to %s", self.report_path)
         
         # Print summary
-        print("\nSummary:")
-        print(f"  - Original tracks: {report['raw_data']['total_tracks']:,}")
-        print(f"  - Final tracks: {report['processed_data']['total_tracks']:,}")
-        print(f"  - Tracks removed: {report['cleaned_data']['tracks_removed']:,} "
-              f"({report['cleaned_data']['removal_percentage']:.2f}%)")
-        print(f"  - Original features: {report['raw_data']['total_columns']}")
-        print(f"  - Final features: {report['processed_data']['total_columns']}")
-        print(f"  - New features added: {report['processed_data']['new_features_added']}")
+        logger.info("\nSummary:")
+        logger.info("  - Original tracks: %s", format(report['raw_data']['total_tracks'], ','))
+        logger.info("  - Final tracks: %s", format(report['processed_data']['total_tracks'], ','))
+        logger.info("  - Tracks removed: %s (%.2f%%)",
+                    format(report['cleaned_data']['tracks_removed'], ','),
+                    report['cleaned_data']['removal_percentage'])
+        logger.info("  - Original features: %s", report['raw_data']['total_columns'])
+        logger.info("  - Final features: %s", report['processed_data']['total_columns'])
+        logger.info("  - New features added: %s", report['processed_data']['new_features_added'])
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    
     # Run the pipeline
     pipeline = PreprocessingPipeline()
     df_processed = pipeline.run(save_intermediate=True)
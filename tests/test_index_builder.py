@@ -0,0 +1,114 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models.index_builder import IndexBuilder
+
+FEATURES = ['danceability', 'energy', 'valence']
+
+def _tracks_with_variants(n_songs: int = 40) -> pd.DataFrame:
+    """Each song in three versions (original, live, remaster) with random features."""
+    rng = np.random.default_rng(0)
+    rows = []
+    for song in range(n_songs):
+        for version, suffix in enumerate(['', ' (Live)', ' - Remastered 2011']):
+            rows.append({
+                'id': f'song{song}v{version}',
+                'name': f'Song {song}{suffix}',
+                'artists': f"['Artist {song % 7}']",
+                'popularity': int(rng.integers(0, 100)),
+                'release_year': 1970 + song,
+                'duration_ms': 200_000 + 1_000 * song + 500 * version,
+            })
+    df = pd.DataFrame(rows)
+    for feature in FEATURES:
+        df[feature] = rng.random(len(df)).astype(np.float32)
+    # Non-positional labels, as after filtering in the pipeline
+    df.index = rng.permutation(len(df)) * 3 + 10
+    return df
+
+@pytest.mark.parametrize('sort_by_pca', [False, True])
+def test_variant_ids_map_to_their_representative(tmp_path, sort_by_pca):
+    df = _tracks_with_variants()
+    builder = IndexBuilder(output_dir=str(tmp_path), index_type='flat', sort_by_pca=sort_by_pca)
+    feature_matrix, track_index = builder.build_index(df, FEATURES)
+
+    metadata = track_index['track_metadata']
+    assert len(metadata) == feature_matrix.shape[0] == 40
+
+    id_to_idx, idx_to_id = track_index['id_to_idx'], track_index['idx_to_id']
+    for row, variants in enumerate(metadata['variant_ids']):
+        assert id_to_idx[idx_to_id[row]] == row
+        assert len(variants) == 2
+        for variant_id in variants:
+            assert id_to_idx[variant_id] == row
+            # Same song as the representative
+            assert variant_id.split('v')[0] == idx_to_id[row].split('v')[0]
+
+    # The saved layout resolves variants to the same rows
+    builder.save_index(feature_matrix, track_index, FEATURES)
+    _, loaded, _ = IndexBuilder(output_dir=str(tmp_path)).load_index()
+    assert loaded['id_to_idx'] == id_to_idx
+
+def _build_titles(tmp_path, tracks):
+    """Build a flat index over (name, duration_ms) tracks by one artist."""
+    df = pd.DataFrame({
+        'id': [f't{i}' for i in range(len(tracks))],
+        'name': [name for name, _ in tracks],
+        'artists': "['Artist']",
+        'popularity': np.arange(len(tracks))[::-1],
+        'release_year': 1990,
+        'duration_ms': [duration for _, duration in tracks],
+    })
+    for feature in FEATURES:
+        df[feature] = np.linspace(0, 1, len(df), dtype=np.float32)
+    builder = IndexBuilder(output_dir=str(tmp_path), index_type='flat', sort_by_pca=False)
+    _, track_index = builder.build_index(df, FEATURES)
+    return track_index['track_metadata']
+
+def test_version_markers_collapse(tmp_path):
+    metadata = _build_titles(tmp_path, [
+        ('Heroes', 370_000),
+        ('Heroes (Live at Wembley)', 375_000),
+        ('Heroes - 2017 Remaster', 370_500),
+        ('Heroes [Remastered 1999]', 369_000),
+        ('Heroes - Single Version', 368_000),
+        ('Heroes - Mono', 371_000),
+    ])
+    assert metadata['id'].tolist() == ['t0']
+    assert sorted(metadata['variant_ids'][0]) == ['t1', 't2', 't3', 't4', 't5']
+
+def test_distinct_works_are_not_collapsed(tmp_path):
+    tracks = [
+        ('Symphony No. 5 in C Minor, Op. 67 - I. Allegro con brio', 450_000),
+        ('Symphony No. 5 in C Minor, Op. 67 - II. Andante con moto', 450_000),
+        ('Hey - Part 1', 240_000),
+        ('Hey - Part 2', 240_000),
+        ('Hey (feat. Someone)', 240_000),
+        ('Hey', 240_000),
+        # Same marker but a clearly different recording
+        ('Hey - Live', 420_000),
+    ]
+    metadata = _build_titles(tmp_path, tracks)
+    assert metadata['id'].tolist() == [f't{i}' for i in range(len(tracks))]
+    assert all(len(v) == 0 for v in metadata['variant_ids'])
+
+def test_filter_mask_over_candidate_rows(tmp_path):
+    df = _tracks_with_variants()
+    df.loc[df.index[:6], 'release_year'] = np.nan
+    builder = IndexBuilder(output_dir=str(tmp_path), index_type='flat', sort_by_pca=False,
+                           dedupe_variants=False)
+    builder.build_index(df, FEATURES)
+
+    rows = np.array([5, 0, 17, 3])
+    mask = builder.get_filter_mask(min_popularity=50, year_range=(1900, 2100), rows=rows)
+    expected = ((df['popularity'].to_numpy()[rows] >= 50)
+                & df['release_year'].notna().to_numpy()[rows])
+    assert mask.tolist() == expected.tolist()
+    assert builder.get_filter_mask().all()
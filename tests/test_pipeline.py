@@ -0,0 +1,127 @@
+import sys
+import os
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.preprocessing.pipeline import PreprocessingPipeline
+
+def _write_raw_tracks(path, n: int = 600) -> str:
+    """
+    Raw tracks CSV exercising the cleaning rules.
+    
+    Release dates mix YYYY-MM-DD and bare YYYY values, and some IDs repeat
+    later in the file after a first copy that cleaning drops (tempo 0, or a
+    missing audio feature).
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'id': [f'id{i:05d}' for i in range(n)],
+        'name': [None if i % 97 == 0 else f'Song {i}' for i in range(n)],
+        'popularity': rng.integers(0, 100, n),
+        'duration_ms': np.where(rng.random(n) < 0.02, 5000, rng.integers(60000, 400000, n)),
+        'explicit': rng.integers(0, 2, n),
+        'artists': [f"['Artist {i % 50}']" for i in range(n)],
+        'id_artists': [f"['a{i % 50}']" for i in range(n)],
+        'release_date': [f'{1950 + i % 70}-0{1 + i % 9}-1{i % 10}' if i % 3 else f'{1950 + i % 70}'
+                         for i in range(n)],
+        'danceability': rng.random(n), 'energy': rng.random(n), 'key': rng.integers(0, 12, n),
+        'loudness': rng.uniform(-40, 0, n), 'mode': rng.integers(0, 2, n),
+        'speechiness': rng.random(n), 'acousticness': rng.random(n),
+        'instrumentalness': rng.random(n), 'liveness': rng.random(n), 'valence': rng.random(n),
+        'tempo': rng.uniform(60, 200, n), 'time_signature': 4,
+    })
+    # First copies that cleaning drops, followed later by valid repeats
+    df.loc[35, 'tempo'] = 0
+    df.loc[36, 'energy'] = np.nan
+    repeats = df.loc[[35, 36, 120, 250]].copy()
+    repeats['tempo'] = 120.0
+    repeats['energy'] = 0.5
+    df = pd.concat([df, repeats, df.loc[[10, 400]]], ignore_index=True)
+    
+    df.to_csv(path, index=False)
+    return str(path)
+
+def test_run_chunked_matches_run(tmp_path):
+    raw_path = _write_raw_tracks(tmp_path / 'tracks.csv')
+    pipeline = PreprocessingPipeline(raw_path, str(tmp_path / 'processed'))
+    
+    expected = pipeline.run(use_cache=False).reset_index(drop=True)
+    expected_stats = dict(pipeline.cleaner.get_cleaning_report())
+    
+    # Chunks start with rows in either date format
+    chunked = pd.read_parquet(pipeline.run_chunked(chunk_size=100))
+    
+    pd.testing.assert_frame_equal(chunked, expected)
+    assert pipeline.cleaner.get_cleaning_report() == expected_stats
+
+def test_cached_run_restores_outputs(tmp_path):
+    raw_path = _write_raw_tracks(tmp_path / 'tracks.csv')
+    output_dir = tmp_path / 'processed'
+    pipeline = PreprocessingPipeline(raw_path, str(output_dir))
+    outputs = ['tracks_processed.parquet', 'tracks_cleaned.parquet', 'feature_metadata.json',
+               'preprocessing_report.json', 'tracks_processed.csv', 'tracks_cleaned.csv']
+    
+    expected = pipeline.run(save_intermediate=True, legacy_csv=True)
+    contents = {name: (output_dir / name).read_bytes() for name in outputs}
+    
+    # Deleted outputs come back from the cache on the next run
+    for name in outputs:
+        (output_dir / name).unlink()
+    cached = PreprocessingPipeline(raw_path, str(output_dir))
+    cached._load_raw = lambda: pytest.fail("cache miss: raw data reloaded")
+    df = cached.run(save_intermediate=True, legacy_csv=True)
+    
+    pd.testing.assert_frame_equal(df, expected.reset_index(drop=True))
+    assert cached.cleaner.get_cleaning_report() == pipeline.cleaner.get_cleaning_report()
+    for name in outputs:
+        path = output_dir / name
+        if name.endswith('.parquet'):
+            pd.testing.assert_frame_equal(pd.read_parquet(path),
+                                          pd.read_parquet(io.BytesIO(contents[name])))
+        else:
+            assert path.read_bytes() == contents[name], name
+
+def test_cache_key_tracks_settings(tmp_path):
+    raw_path = _write_raw_tracks(tmp_path / 'tracks.csv')
+    pipeline = PreprocessingPipeline(raw_path, str(tmp_path / 'processed'))
+    key = pipeline._cache_key()
+    
+    # Stable across runs, which only change per-run state
+    pipeline.run()
+    assert pipeline._cache_key() == key
+    
+    # A changed setting misses the cache
+    pipeline.engineer.temporal_stats = {'median_year': 1990.0}
+    assert pipeline._cache_key() != key
+
+def test_cache_keeps_only_latest_entry(tmp_path):
+    raw_path = _write_raw_tracks(tmp_path / 'tracks.csv')
+    pipeline = PreprocessingPipeline(raw_path, str(tmp_path / 'processed'))
+    
+    pipeline.run(save_intermediate=True)
+    pipeline.engineer.temporal_stats = {'median_year': 1990.0}
+    pipeline.run()
+    
+    key = pipeline._cache_key()
+    cached = sorted(path.name for path in pipeline.cache_dir.iterdir())
+    assert cached == sorted(path.name for path in pipeline._cache_files(key, False).values())
+
+def test_run_lazy_matches_run(tmp_path):
+    pytest.importorskip('polars')
+    raw_path = _write_raw_tracks(tmp_path / 'tracks.csv')
+    pipeline = PreprocessingPipeline(raw_path, str(tmp_path / 'processed'))
+    
+    expected = pipeline.run(use_cache=False).reset_index(drop=True)
+    lazy = pd.read_parquet(pipeline.run_lazy())
+    
+    # run_lazy parses each release date on its own (see its docstring)
+    date_columns = ['release_date_parsed', 'release_year', 'release_decade',
+                    'release_era', 'track_age', 'track_age_normalized']
+    pd.testing.assert_frame_equal(lazy.drop(columns=date_columns),
+                                  expected.drop(columns=date_columns))
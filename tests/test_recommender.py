@@ -0,0 +1,50 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import recommender as recommender_module
+from src.models.index_builder import IndexBuilder
+from src.models.recommender import MusicRecommender
+
+FEATURES = ['danceability', 'energy', 'valence', 'tempo_normalized']
+
+@pytest.fixture
+def recommender(tmp_path):
+    """Flat-index recommender over random tracks."""
+    rng = np.random.default_rng(0)
+    n = 60
+    df = pd.DataFrame({
+        'id': [f'id{i:03d}' for i in range(n)],
+        'name': [f'Song {i}' for i in range(n)],
+        'artists': [f"['Artist {i % 20}']" for i in range(n)],
+        'popularity': rng.integers(0, 100, n),
+        'release_year': rng.integers(1960, 2020, n),
+        'danceability': rng.random(n), 'energy': rng.random(n), 'valence': rng.random(n),
+        'tempo': rng.uniform(60, 200, n),
+    })
+    df['tempo_normalized'] = df['tempo'] / 250
+    data_path = str(tmp_path / 'tracks_processed.parquet')
+    df.to_parquet(data_path, index=False)
+
+    model_dir = str(tmp_path / 'models')
+    builder = IndexBuilder(output_dir=model_dir, index_type='flat', dedupe_variants=False)
+    feature_matrix, track_index = builder.build_index(df, FEATURES)
+    builder.save_index(feature_matrix, track_index, FEATURES)
+    return MusicRecommender(model_dir=model_dir, data_path=data_path, use_ann=False)
+
+def test_batch_blocks_match_single_block(recommender, monkeypatch):
+    track_ids = [f'id{i:03d}' for i in range(0, 60, 5)]
+    expected = recommender.get_recommendations_batch(track_ids, n_recommendations=8)
+
+    # Blocks smaller than the query list, with a partial last block
+    monkeypatch.setattr(recommender_module, 'BATCH_BLOCK_ROWS', 5)
+    assert recommender.get_recommendations_batch(track_ids, n_recommendations=8) == expected
+    for track_id, recommendations in zip(track_ids, expected):
+        assert len(recommendations) == 8
+        assert track_id not in [r['id'] for r in recommendations]
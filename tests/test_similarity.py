@@ -0,0 +1,37 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import _kernels, similarity
+from src.models.similarity import SimilarityComputer
+
+@pytest.fixture
+def no_compiled_kernels(monkeypatch):
+    """Run as if neither numba nor simsimd were installed."""
+    monkeypatch.setattr(_kernels, 'HAS_NUMBA', False)
+    monkeypatch.setattr(_kernels, 'cosine_scores', _kernels._cosine_scores_numpy)
+    monkeypatch.setattr(_kernels, 'topk_cosine', _kernels._topk_cosine_numpy)
+    monkeypatch.setattr(similarity, 'simsimd', None)
+
+@pytest.mark.parametrize('matrix_is_unit', [False, True])
+def test_excluded_rows_are_never_returned(no_compiled_kernels, matrix_is_unit):
+    rng = np.random.default_rng(0)
+    feature_matrix = rng.standard_normal((30, 5)).astype(np.float32)
+    if matrix_is_unit:
+        feature_matrix = SimilarityComputer.normalize_rows(feature_matrix)
+    computer = SimilarityComputer()
+
+    for k in (5, 29, 30, 40):
+        indices, scores = computer.get_top_k_similar(
+            feature_matrix[3], feature_matrix, k=k, exclude_indices=[3, 7],
+            matrix_is_unit=matrix_is_unit,
+        )
+        assert len(indices) == min(k, 28)
+        assert not {3, 7} & set(indices.tolist())
+        assert np.isfinite(scores).all()
+        assert (np.diff(scores) <= 1e-6).all()
@@ -4,13 +4,30 @@ import os
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.api.spotify_client import SpotifyClient
+from src.api.spotify_client import SpotifyClient, AUDIO_FEATURES_BATCH_SIZE
+
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
+
+# Replay Spotify responses from a local cache on repeat runs
+HTTP_CACHE_PATH = os.path.join(os.path.dirname(__file__), '.http_cache')
+
+def _make_client() -> SpotifyClient:
+    """Client whose API calls go through a cached session when requests_cache is installed."""
+    if requests_cache is None:
+        return SpotifyClient()
+    # A session of its own, so nothing else in the process is cached
+    return SpotifyClient(requests_session=requests_cache.CachedSession(
+        HTTP_CACHE_PATH, expire_after=86400
+    ))
 
 def test_spotify_client():
     print("Testing Spotify Client...")
     
     try:
-        client = SpotifyClient()
+        client = _make_client()
     except ValueError as e:
         print(f"Skipping test: {e}")
         print("Please set SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET in .env")
@@ -39,5 +56,66 @@ def test_spotify_client():
     else:
         print("No audio features found.")
 
+def test_spotify_batch_features():
+    print("Testing batched audio features...")
+    
+    try:
+        client = _make_client()
+    except ValueError as e:
+        print(f"Skipping test: {e}")
+        return
+
+    # 1. Collect a batch of track IDs from one search
+    results = client.search_track("Queen", limit=50)
+    if not results:
+        print("No results found.")
+        return
+
+    track_ids = [track['id'] for track in results]
+
+    # 2. Fetch features for the whole batch in one request
+    print(f"\nFetching audio features for {len(track_ids)} tracks...")
+    features = client.get_tracks_features(track_ids)
+    assert len(features) == len(track_ids)
+    print(f"Got features for {sum(f is not None for f in features)} of {len(track_ids)} tracks")
+
+class _StubSpotify:
+    """Stands in for spotipy.Spotify, recording audio_features batches."""
+
+    def __init__(self, missing_ids=(), empty_batches=()):
+        self.calls = []
+        self.missing_ids = set(missing_ids)
+        self.empty_batches = set(empty_batches)
+
+    def audio_features(self, track_ids):
+        self.calls.append(list(track_ids))
+        if len(self.calls) - 1 in self.empty_batches:
+            return None
+        return [None if tid in self.missing_ids else {'id': tid} for tid in track_ids]
+
+def test_get_tracks_features_batching():
+    client = SpotifyClient.__new__(SpotifyClient)
+    track_ids = [f'track{i}' for i in range(250)]
+    client.sp = _StubSpotify(missing_ids={'track7', 'track120'}, empty_batches={2})
+
+    features = client.get_tracks_features(track_ids)
+
+    # At most 100 ids per request, in order
+    assert [len(call) for call in client.sp.calls] == [AUDIO_FEATURES_BATCH_SIZE,
+                                                       AUDIO_FEATURES_BATCH_SIZE, 50]
+    assert sum(client.sp.calls, []) == track_ids
+
+    # One entry per input id: None for unknown ids and for an empty response
+    assert len(features) == len(track_ids)
+    assert features[7] is None and features[120] is None
+    assert all(f is None for f in features[200:])
+    assert [f['id'] for f in features[:200] if f is not None] == [
+        tid for tid in track_ids[:200] if tid not in {'track7', 'track120'}
+    ]
+
+    assert client.get_tracks_features([]) == []
+
 if __name__ == "__main__":
     test_spotify_client()
+    test_spotify_batch_features()
+    test_get_tracks_features_batching()